@@ -0,0 +1,54 @@
+from typing import Dict
+import logging
+import threading
+import time
+
+from langgraph.checkpoint.memory import MemorySaver
+
+logger = logging.getLogger(__name__)
+
+
+class TTLMemorySaver(MemorySaver):
+    """
+    MemorySaver that forgets threads which have been idle longer than `ttl` seconds
+
+    Plain MemorySaver keeps every checkpoint of every thread for the life of the
+    process. Here each write records the thread's last activity, and at most
+    once per `sweep_interval` the idle threads are deleted, bounding memory to
+    the active working set. No background task is needed: sweeps piggyback on
+    writes (aput/aput_writes delegate to the sync methods overridden here).
+    """
+
+    def __init__(self, ttl: float = 24 * 3600, sweep_interval: float = 3600, **kwargs):
+        super().__init__(**kwargs)
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._last_seen: Dict[str, float] = {}
+        self._last_sweep = time.monotonic()
+        self._ttl_lock = threading.Lock()
+
+    def _touch(self, config) -> None:
+        thread_id = config.get("configurable", {}).get("thread_id")
+        now = time.monotonic()
+        with self._ttl_lock:
+            if thread_id is not None:
+                self._last_seen[str(thread_id)] = now
+            if now - self._last_sweep < self.sweep_interval:
+                return
+            self._last_sweep = now
+            expired = [tid for tid, seen in self._last_seen.items() if now - seen > self.ttl]
+            for tid in expired:
+                del self._last_seen[tid]
+        for tid in expired:
+            self.delete_thread(tid)
+        if expired:
+            logger.info("Evicted %d idle conversation threads from checkpointer", len(expired))
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        result = super().put(config, checkpoint, metadata, new_versions)
+        self._touch(config)
+        return result
+
+    def put_writes(self, config, writes, task_id, task_path: str = ""):
+        super().put_writes(config, writes, task_id, task_path)
+        self._touch(config)
@@ -0,0 +1,132 @@
+from typing import Any, Optional
+import asyncio
+import contextvars
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+# Substrings identifying transient Gemini errors worth retrying (rate limits, overload)
+_RETRYABLE_MARKERS = ("429", "503", "resource_exhausted", "resourceexhausted", "unavailable", "overloaded")
+
+
+def _is_retryable(error: Exception) -> bool:
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in _RETRYABLE_MARKERS)
+
+
+class _TokenBucket:
+    """Async token bucket limiting calls to `rate` per second (bursts up to `capacity`)"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class LLMDispatcher:
+    """
+    Single entry point for LLM calls made by the agent graph
+
+    Calls submitted by concurrent sessions are queued and each one is issued as
+    soon as the worker picks it up, concurrently with the others, and retried
+    with exponential backoff on rate limit / overload errors. An optional token
+    bucket caps the call rate and `max_concurrency` caps the calls in flight at
+    once.
+    """
+
+    def __init__(
+        self,
+        llm: Any,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        rate_per_sec: float = 0,
+        max_concurrency: int = 0,
+    ):
+        self.llm = llm
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self._rate_per_sec = rate_per_sec
+        self._max_concurrency = max_concurrency
+        self._bucket: Optional[_TokenBucket] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._calls: set = set()  # strong refs so in-flight call tasks aren't GC'd
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        # Queues and tasks are bound to a loop; scripts calling asyncio.run()
+        # repeatedly get a fresh worker per loop
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._bucket = _TokenBucket(self._rate_per_sec) if self._rate_per_sec > 0 else None
+            self._semaphore = asyncio.Semaphore(self._max_concurrency) if self._max_concurrency > 0 else None
+            # Empty context so the worker doesn't inherit the callbacks/config of
+            # whichever graph run happened to submit first
+            self._worker = loop.create_task(self._run(), context=contextvars.Context())
+        return self._queue
+
+    async def submit(self, prompt: Any, config: Optional[dict] = None) -> Any:
+        """Queue an LLM call and wait for its result (same return value as llm.ainvoke)"""
+        queue = self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await queue.put((prompt, config, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            prompt, config, future = await self._queue.get()
+            if future.cancelled():
+                continue
+            # Don't wait for this call to finish before picking up the next one
+            task = loop.create_task(self._call(prompt, config, future))
+            self._calls.add(task)
+            task.add_done_callback(self._calls.discard)
+
+    async def _invoke(self, prompt: Any, config: Optional[dict]) -> Any:
+        # Held only for the call itself, not during retry backoff
+        if self._semaphore is None:
+            return await self.llm.ainvoke(prompt, config=config)
+        async with self._semaphore:
+            return await self.llm.ainvoke(prompt, config=config)
+
+    async def _call(self, prompt: Any, config: Optional[dict], future: asyncio.Future) -> None:
+        # A cancelled submitter (e.g. a client that disconnected mid-stream)
+        # cancels this whole task, including an attempt already in flight
+        current = asyncio.current_task()
+        future.add_done_callback(lambda f: current.cancel() if f.cancelled() else None)
+        for attempt in range(self.max_retries + 1):
+            if self._bucket is not None:
+                await self._bucket.acquire()
+            try:
+                result = await self._invoke(prompt, config)
+            except Exception as e:
+                if attempt < self.max_retries and _is_retryable(e):
+                    delay = self.base_delay * (2 ** attempt) * (1 + random.random() * 0.25)
+                    logger.warning("LLM call failed (%s), retrying in %.2fs", type(e).__name__, delay)
+                    await asyncio.sleep(delay)
+                    continue
+                if not future.done():
+                    future.set_exception(e)
+                return
+            if not future.done():
+                future.set_result(result)
+            return
@@ -1,14 +1,189 @@
-from typing import Any, Dict, TypedDict
+from typing import Any, Dict, Optional, TypedDict
+import asyncio
+import functools
 import logging
-from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_google_genai import ChatGoogleGenerativeAI
+import re
+import threading
+from langgraph.graph import StateGraph, START, END
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 from config.env_config import EnvironmentConfig
-from agent.tools import get_user_latest_form, fetch_weather_context, fetch_market_context, web_search
+from agent.tools import gather_context, web_search_async
+from agent.prompt import REPLY_SYSTEM_PROMPT
+from agent.llm_dispatcher import LLMDispatcher
+from agent.checkpointer import TTLMemorySaver
 
 # Configure logging
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=logging.DEBUG if EnvironmentConfig.DEBUG else logging.INFO)
+
+@functools.lru_cache(maxsize=1)
+def _get_dispatcher() -> Optional[LLMDispatcher]:
+    """
+    Shared Gemini client wrapped in the LLM dispatcher, or None without an API key
+
+    Created once per process on first use, so every request reuses the same
+    connection pool. The client talks gRPC, so concurrent calls from different
+    sessions are multiplexed as HTTP/2 streams over one long-lived channel.
+    langchain_google_genai (protobuf/grpc) is imported here rather than at
+    module load, keeping it off the startup path of scripts and health checks.
+    All graph LLM calls go through the dispatcher: queueing, retry/backoff and
+    rate limiting live there instead of in each node.
+    """
+    if not EnvironmentConfig.GEMINI_API_KEY:
+        return None
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    logger.info("Initializing Gemini with API key: %s...", EnvironmentConfig.GEMINI_API_KEY[:10])
+    llm = ChatGoogleGenerativeAI(
+        model="gemini-2.0-flash",
+        api_key=EnvironmentConfig.GEMINI_API_KEY,
+        temperature=0.6,
+        timeout=EnvironmentConfig.GEMINI_TIMEOUT,
+        # LLMDispatcher already retries with backoff; keep the client's own retries
+        # low so one failing call doesn't multiply into dozens of attempts
+        max_retries=1,
+    )
+    return LLMDispatcher(
+        llm,
+        rate_per_sec=EnvironmentConfig.LLM_RATE_LIMIT,
+        max_concurrency=EnvironmentConfig.LLM_CONCURRENCY,
+    )
+
+
+# Messages kept in the checkpointed state; what actually reaches the prompt is
+# further limited by HISTORY_TOKEN_BUDGET
+MAX_STORED_HISTORY = 20
+
+# Once history grows past SUMMARY_TRIGGER messages, everything but the newest
+# SUMMARY_KEEP_RAW is folded into the rolling summary
+SUMMARY_TRIGGER = 10
+SUMMARY_KEEP_RAW = 6
+
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for Gemini/English text)"""
+    return len(text) // 4 + 1
+
+
+def _message_tokens(msg: dict) -> int:
+    """Token estimate stored on the message when it was added, computed on demand for older entries"""
+    tokens = msg.get("tokens")
+    return tokens if tokens is not None else _estimate_tokens(msg.get("content", ""))
+
+
+def trim_to_budget(messages: list, budget: int) -> list:
+    """Return the newest messages whose combined size fits within budget tokens"""
+    used = 0
+    start = len(messages)
+    for msg in reversed(messages):
+        tokens = _message_tokens(msg)
+        if used + tokens > budget:
+            break
+        used += tokens
+        start -= 1
+    return messages[start:]
+
+
+def _append_exchange(history: list, user_message: str, reply: str) -> list:
+    """Return history with the new user/assistant exchange, bounded to MAX_STORED_HISTORY"""
+    # Token estimates are computed once here and reused by every later turn's
+    # budget trim and logging instead of re-measuring the whole history
+    return [
+        *(history or []),
+        {"role": "user", "content": user_message, "tokens": _estimate_tokens(user_message)},
+        {"role": "assistant", "content": reply, "tokens": _estimate_tokens(reply)},
+    ][-MAX_STORED_HISTORY:]
+
+
+# Keywords that suggest need for current/real-time information
+SEARCH_KEYWORDS = (
+    "current", "latest", "recent", "today", "now", "2024", "2025",
+    "price", "market price", "cost", "news", "update",
+    "weather forecast", "climate data", "research", "study"
+)
+# One precompiled alternation scans the message once instead of once per keyword.
+# Anchored at word starts so "now" no longer fires on "know", while plurals
+# and suffixes ("prices", "updates") still match.
+_SEARCH_KEYWORD_RE = re.compile(r"\b(?:" + "|".join(map(re.escape, SEARCH_KEYWORDS)) + ")", re.IGNORECASE)
+
+
+# Messages answered without the LLM (compared after lowercasing and stripping punctuation)
+GREETINGS = {"hi", "hello", "hey", "salam", "assalamualaikum", "assalam o alaikum"}
+THANKS = {"thanks", "thank you", "thx", "shukriya"}
+FAREWELLS = {"bye", "goodbye", "bye bye", "khuda hafiz", "allah hafiz"}
+CONFIRMATIONS = {"ok", "okay"}
+GREETING_REPLY = "Hi! I'm ReGenAI. How can I help with your farm today?"
+THANKS_REPLY = "You're welcome! Let me know if there's anything else I can help with."
+FAREWELL_REPLY = "Goodbye! Wishing you a good harvest. Come back any time you need help."
+CONFIRMATION_REPLY = "Great! Let me know if there's anything else I can help with."
+
+
+def _quick_reply(user_message: str) -> str | None:
+    """Deterministic reply for trivial messages, or None if the LLM is needed"""
+    msg_norm = user_message.strip().lower().strip("!?.,")
+    if msg_norm in GREETINGS:
+        return GREETING_REPLY
+    if msg_norm in THANKS:
+        return THANKS_REPLY
+    if msg_norm in FAREWELLS:
+        return FAREWELL_REPLY
+    if msg_norm in CONFIRMATIONS:
+        return CONFIRMATION_REPLY
+    return None
+
+
+# (form field, label, suffix) rendered into the farm profile, in prompt order
+_FARM_PROFILE_FIELDS = (
+    ("location", "Location", ""),
+    ("soil_type", "Soil Type", ""),
+    ("land_size", "Land Size", " acres"),
+    ("goal", "Farming Goal", ""),
+    ("water_source", "Water Source", ""),
+    ("irrigation", "Irrigation", ""),
+    ("specific_crop", "Interested in", ""),
+    ("fertilizers_preference", "Fertilizer Preference", ""),
+)
+
+
+def _form_key(form: dict) -> tuple:
+    """Hashable, order-independent key for a form; empty fields are dropped as they never render"""
+    return tuple(sorted((k, str(v)) for k, v in form.items() if v))
+
+
+@functools.lru_cache(maxsize=512)
+def render_farm_info(form_items: tuple) -> str:
+    """Farm profile section of the prompt; form_items comes from _form_key(form)"""
+    form = dict(form_items)
+    details = [f"- {label}: {form[key]}{suffix}" for key, label, suffix in _FARM_PROFILE_FIELDS if form.get(key)]
+    if not details:
+        return ""
+    return (
+        "\n\n**User's Farm Profile:**\n" + "\n".join(details)
+        + "\n\n(Use this information to personalize your advice)"
+    )
+
+
+@functools.lru_cache(maxsize=512)
+def render_context_info(weather_summary: Optional[str], demand_trends: Optional[tuple]) -> str:
+    """Weather/market section of the prompt; None means that context is missing"""
+    context_info = ""
+    if weather_summary is not None:
+        context_info += f"\n\nWeather Context: {weather_summary}"
+    if demand_trends is not None:
+        context_info += f"\n\nMarket Trends: {', '.join(demand_trends)}"
+    return context_info
+
+
+# Dynamic half of the reply prompt (REPLY_SYSTEM_PROMPT is sent separately as the
+# system message). Ordered from most to least stable so the cacheable prefix is
+# as long as possible: per-user farm/context, then the (append-only) history,
+# then the per-message search results and message
+_REPLY_TEMPLATE = (
+    "{farm}{context}{summary}{history}{search}"
+    "\n\n---\n\n**Current User Message:**\n{message}"
+    "\n\n**Your Response (remember to use conversation history):**"
+)
 
 
 class AgentState(TypedDict, total=False):
@@ -20,176 +195,137 @@ class AgentState(TypedDict, total=False):
     reply: str
     conversation_history: list  # Store last 3 messages for context
     search_results: Dict[str, Any]  # Web search results to show in frontend
+    summary: str  # Rolling summary of messages compressed out of conversation_history
 
 
 def build_graph() -> StateGraph:
     graph = StateGraph(AgentState)
 
     # Validate API key
-    if not EnvironmentConfig.GEMINI_API_KEY:
+    dispatcher = _get_dispatcher()
+    if dispatcher is None:
         logger.error("GEMINI_API_KEY_ALI not found in environment")
         raise ValueError(
             "GEMINI_API_KEY_ALI not found in environment. "
             "Please set it in your .env file. "
             "Get your key from: https://makersuite.google.com/app/apikey"
         )
-    
-    logger.info(f"Initializing Gemini with API key: {EnvironmentConfig.GEMINI_API_KEY[:10]}...")
 
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash",
-        api_key=EnvironmentConfig.GEMINI_API_KEY,
-        temperature=0.6,
-    )
+    async def summarize_history(old_messages: list, previous_summary: str) -> str:
+        """Fold old messages into the rolling summary, keeping identity and preferences"""
+        transcript = "\n".join(
+            f"{'User' if m.get('role') == 'user' else 'Assistant'}: {m.get('content', '')}"
+            for m in old_messages
+        )
+        prompt = (
+            "Summarize this farming-assistant conversation in under 200 tokens. "
+            "Preserve the user's name, personal details, preferences, crops mentioned, "
+            "plans and any decisions made. Merge it with the previous summary.\n\n"
+            f"Previous summary: {previous_summary or 'None'}\n\n"
+            f"Conversation:\n{transcript}"
+        )
+        ai = await dispatcher.submit(prompt)
+        return ai.content or previous_summary
 
-    def decide_search(state: AgentState) -> AgentState:
+    async def decide_search(state: AgentState) -> AgentState:
         """Decide if web search is needed based on the user's question"""
         user_message = state.get("message", "").lower()
         
-        # Keywords that suggest need for current/real-time information
-        search_keywords = [
-            "current", "latest", "recent", "today", "now", "2024", "2025",
-            "price", "market price", "cost", "news", "update",
-            "weather forecast", "climate data", "research", "study"
-        ]
-        
-        needs_search = any(keyword in user_message for keyword in search_keywords)
+        needs_search = bool(_SEARCH_KEYWORD_RE.search(user_message))
         
         if needs_search:
-            logger.info(f"Web search needed for query: {user_message[:50]}")
+            logger.info("Web search needed for query: %s", user_message[:50])
             # Perform web search
             search_query = f"{user_message} Pakistan agriculture farming"
-            search_data = web_search(search_query, max_results=3)
+            search_data = await web_search_async(search_query, max_results=3)
             
-            return {
-                **state,
-                "search_results": search_data
-            }
+            # Runs in parallel with enrich, so only return the key we own
+            return {"search_results": search_data}
         else:
             logger.info("No web search needed")
-            return {
-                **state,
-                "search_results": {}
-            }
+            return {"search_results": {}}
     
-    def enrich_context(state: AgentState) -> AgentState:
+    async def enrich_context(state: AgentState) -> AgentState:
         try:
             form = state.get("form", {})
             message = state.get("message", "")
-            logger.info(f"Enriching context - form type: {type(form)}, has data: {bool(form)}, message: '{message[:50]}'")
+            logger.info("Enriching context - form type: %s, has data: %s, message: '%s'", type(form), bool(form), message[:50])
             if form:
-                logger.info(f"Form location: {form.get('location', 'N/A')}")
-            weather = fetch_weather_context(form if isinstance(form, dict) else {})
-            market = fetch_market_context(form if isinstance(form, dict) else {})
+                logger.info("Form location: %s", form.get('location', 'N/A'))
+            # Web search has its own node (running in parallel with this
+            # one), so only weather and market are gathered here
+            gathered = await gather_context(form)
             
-            # Return updated state with context added
-            return {
-                **state,  # Preserve all existing state
-                "context": {"weather": weather, "market": market}
-            }
+            # Runs in parallel with search, so only return the key we own
+            return {"context": {"weather": gathered["weather"], "market": gathered["market"]}}
         except Exception as e:
-            logger.error(f"Error enriching context: {e}", exc_info=True)
-            return {
-                **state,
-                "context": {"weather": {}, "market": {}}
-            }
+            logger.error("Error enriching context: %s", e, exc_info=True)
+            return {"context": {"weather": {}, "market": {}}}
 
-    def generate_reply(state: AgentState) -> AgentState:
-        logger.info(f"generate_reply called - state keys: {list(state.keys())}")
+    async def generate_reply(state: AgentState, config: RunnableConfig) -> AgentState:
+        logger.info("generate_reply called - state keys: %s", list(state))
         form = state.get("form", {})
         context = state.get("context", {})
         user_message = state.get("message", "")
         
-        logger.info(f"User message: '{user_message}'")
+        logger.info("User message: '%s'", user_message)
         
         if not user_message:
             logger.warning("No user message found in state")
+            return {"reply": "I didn't receive your message. Please try again."}
+        
+        conversation_history = state.get("conversation_history", [])
+        summary = state.get("summary", "")
+        
+        # Greetings, thanks, goodbyes and bare "ok"s don't need a multi-second LLM call
+        quick_reply = _quick_reply(user_message)
+        if quick_reply is not None:
+            logger.info("Answered with a canned reply, skipping LLM call")
             return {
-                **state,
-                "reply": "I didn't receive your message. Please try again."
+                "reply": quick_reply,
+                "conversation_history": _append_exchange(conversation_history, user_message, quick_reply),
             }
         
-        # Build context-aware prompt
-        system = (
-            "You are ReGenAI Assistant, a friendly AI farming advisor for Pakistan.\n\n"
-            
-            "**Core Rules:**\n"
-            "1. **Be Conversational**: Chat naturally like a helpful friend\n"
-            "2. **Stay Focused**: Answer ONLY what the user asks - don't give extra information\n"
-            "3. **Be Brief**: Keep responses short (2-3 sentences for simple questions, 1 paragraph for advice)\n"
-            "4. **REMEMBER EVERYTHING**: You MUST remember and use information from previous messages:\n"
-            "   - If user says 'my name is X', remember X is their name\n"
-            "   - If user asks 'what is my name?', answer with the exact name they told you\n"
-            "   - Remember their preferences, questions, and any personal info they share\n"
-            "5. **Personalize**: Reference their farm details and previous conversation when relevant\n\n"
-            
-            "**Response Guidelines:**\n"
-            "- **Simple greetings** (hi, hello): Respond warmly in 1-2 sentences, ask how you can help\n"
-            "- **Personal info** (my name is X): Acknowledge and remember it. Use it in future responses\n"
-            "  Example: User says 'hi my name is alihassan' → Remember: name = alihassan\n"
-            "  Later user asks 'what is my name?' → Answer: 'Your name is alihassan'\n"
-            "- **Questions about you**: Briefly explain you're an AI farming assistant (1-2 sentences)\n"
-            "- **Farming questions**: Give direct, practical answers. Use bullet points only if listing steps\n"
-            "- **Follow-up questions**: Reference previous conversation naturally\n\n"
-            
-            "**Length Guidelines:**\n"
-            "- Greetings/casual chat: 1-2 sentences\n"
-            "- Simple questions: 2-3 sentences\n"
-            "- Advice/recommendations: 1 short paragraph (4-5 sentences max)\n"
-            "- Complex topics: 2 paragraphs maximum with bullet points if needed\n\n"
-            
-            "**What NOT to do:**\n"
-            "- Don't give long explanations unless asked\n"
-            "- Don't list everything you know about a topic\n"
-            "- Don't repeat information already in conversation\n"
-            "- Don't be overly formal - be friendly and natural"
-        )
-        
-        # Add farm context if available
-        farm_info = ""
-        if form:
-            details = []
-            if form.get('location'):
-                details.append(f"Location: {form.get('location')}")
-            if form.get('soil_type'):
-                details.append(f"Soil Type: {form.get('soil_type')}")
-            if form.get('land_size'):
-                details.append(f"Land Size: {form.get('land_size')} acres")
-            if form.get('goal'):
-                details.append(f"Farming Goal: {form.get('goal')}")
-            if form.get('water_source'):
-                details.append(f"Water Source: {form.get('water_source')}")
-            if form.get('irrigation'):
-                details.append(f"Irrigation: {form.get('irrigation')}")
-            if form.get('specific_crop'):
-                details.append(f"Interested in: {form.get('specific_crop')}")
-            if form.get('fertilizers_preference'):
-                details.append(f"Fertilizer Preference: {form.get('fertilizers_preference')}")
-            
-            if details:
-                farm_info = "\n\n**User's Farm Profile:**\n" + "\n".join(f"- {d}" for d in details)
-                farm_info += "\n\n(Use this information to personalize your advice)"
+        # Both sections only change when the form does, so they're rendered once
+        # and then served from the lru_caches for the rest of the session
+        farm_info = render_farm_info(_form_key(form)) if form else ""
         
         context_info = ""
         if context:
             weather = context.get('weather', {})
             market = context.get('market', {})
-            if weather:
-                context_info += f"\n\nWeather Context: {weather.get('summary', 'N/A')}"
-            if market:
-                context_info += f"\n\nMarket Trends: {', '.join(market.get('demand_trends', []))}"
-        
-        # Build the complete prompt
-        prompt_parts = [system]
+            context_info = render_context_info(
+                str(weather.get('summary', 'N/A')) if weather else None,
+                tuple(map(str, market.get('demand_trends', []))) if market else None,
+            )
         
-        if farm_info:
-            prompt_parts.append(farm_info)
+        # Summary of older messages compressed out of the raw history
+        summary_info = f"\n\n**Conversation Summary:** {summary}" if summary else ""
         
-        if context_info:
-            prompt_parts.append(context_info)
+        # Add as much recent conversation history as fits the token budget
+        logger.info("Conversation history available: %d messages", len(conversation_history))
+        recent_history = trim_to_budget(conversation_history, EnvironmentConfig.HISTORY_TOKEN_BUDGET)
+        history_info = ""
+        if conversation_history:
+            # The full history dump is only formatted when debug logging is on
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("History content: %r", conversation_history)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(
+                    "History window: %d/%d messages, ~%d tokens",
+                    len(recent_history), len(conversation_history),
+                    sum(_message_tokens(m) for m in recent_history),
+                )
+            if recent_history:
+                history_info = "\n\n**Previous Conversation (Remember this context!):**" + "".join(
+                    f"\nUser said: {msg.get('content', '')}" if msg.get("role", "user") == "user"
+                    else f"\nYou replied: {msg.get('content', '')}"
+                    for msg in recent_history
+                )
         
-        # Add web search results if available
+        # Web search results if available
         search_results = state.get("search_results", {})
+        search_info = ""
         if search_results and search_results.get("success"):
             search_info = "\n\n**Web Search Results:**"
             if search_results.get("answer"):
@@ -201,55 +337,44 @@ def build_graph() -> StateGraph:
                 search_info += f"\n   Source: {result['url']}"
             
             search_info += "\n\n(Use this current information to provide up-to-date advice)"
-            prompt_parts.append(search_info)
             logger.info("Added web search results to prompt")
         
-        # Add conversation history (last 3 exchanges only to manage context window)
-        conversation_history = state.get("conversation_history", [])
-        logger.info(f"Conversation history available: {len(conversation_history)} messages")
-        if conversation_history:
-            logger.info(f"History content: {conversation_history}")
-            # Keep only last 3 exchanges (6 messages total: 3 user + 3 assistant)
-            recent_history = conversation_history[-6:] if len(conversation_history) > 6 else conversation_history
-            if recent_history:
-                prompt_parts.append("\n\n**Previous Conversation (Remember this context!):**")
-                for i, msg in enumerate(recent_history):
-                    role = msg.get("role", "user")
-                    content = msg.get("content", "")
-                    if role == "user":
-                        prompt_parts.append(f"\nUser said: {content}")
-                    else:
-                        prompt_parts.append(f"\nYou replied: {content}")
-                
-                prompt_parts.append("\n\n**CRITICAL INSTRUCTIONS - READ CAREFULLY:**")
-                prompt_parts.append("\n1. Look at the conversation history above")
-                prompt_parts.append("\n2. Extract key information:")
-                prompt_parts.append("\n   - If user said 'hi my name is X' or 'my name is X', extract X as their name")
-                prompt_parts.append("\n   - If user mentioned crops, preferences, or plans, remember them")
-                prompt_parts.append("\n3. When user asks 'what is my name?', answer with the EXACT name from history")
-                prompt_parts.append("\n4. NEVER say 'I don't know' or 'I don't have access' if the info is in the history above")
-                prompt_parts.append("\n\nExample:")
-                prompt_parts.append("\n  History shows: 'User said: hi my name is alihassan'")
-                prompt_parts.append("\n  User asks: 'what is my name?'")
-                prompt_parts.append("\n  Correct answer: 'Your name is alihassan' or 'You told me your name is alihassan'")
-        
-        # Add current message
-        prompt_parts.append("\n\n---\n\n**Current User Message:**")
-        prompt_parts.append(f"\n{user_message}")
-        prompt_parts.append("\n\n**Your Response (remember to use conversation history):**")
-        
-        prompt = "".join(prompt_parts)
+        body = _REPLY_TEMPLATE.format(
+            farm=farm_info,
+            context=context_info,
+            summary=summary_info,
+            history=history_info,
+            search=search_info,
+            message=user_message,
+        ).lstrip()
+        # System instructions go first and byte-identical in their own message so
+        # Gemini can deduplicate them server-side across calls
+        messages = [SystemMessage(content=REPLY_SYSTEM_PROMPT), HumanMessage(content=body)]
+        prompt_chars = len(REPLY_SYSTEM_PROMPT) + len(body)
+        prompt_tokens = _estimate_tokens(REPLY_SYSTEM_PROMPT) + _estimate_tokens(body)
         
         # Log prompt size to monitor context window
-        logger.info(f"Prompt size: {len(prompt)} characters, ~{len(prompt)//4} tokens")
+        logger.info("Prompt size: %d characters, ~%d tokens", prompt_chars, prompt_tokens)
+        
+        # Compress older history alongside the reply call rather than after it
+        summary_task = None
+        if len(conversation_history) > SUMMARY_TRIGGER:
+            summary_task = asyncio.create_task(
+                summarize_history(conversation_history[:-SUMMARY_KEEP_RAW], summary)
+            )
         
         try:
-            logger.info(f"Invoking LLM with prompt length: {len(prompt)}")
-            ai = llm.invoke(prompt)
-            logger.info(f"LLM response received: {bool(ai.content)}")
-            reply = ai.content if ai.content else "I'm here to help! Could you please rephrase your question?"
+            logger.info("Invoking LLM with prompt length: %d", prompt_chars)
+            # Passing the node's config lets LangGraph's stream_mode="messages"
+            # see the tokens as Gemini produces them (see astream_reply)
+            ai = await dispatcher.submit(messages, config=config)
+            logger.info("LLM response received: %s", bool(ai.content))
+            if ai.content:
+                reply = ai.content
+            else:
+                reply = "I'm here to help! Could you please rephrase your question?"
         except Exception as e:
-            logger.error(f"LLM invocation error: {type(e).__name__}: {str(e)}")
+            logger.error("LLM invocation error: %s: %s", type(e).__name__, e)
             error_msg = str(e)
             if "API key" in error_msg or "authentication" in error_msg.lower():
                 reply = (
@@ -262,47 +387,97 @@ def build_graph() -> StateGraph:
                     f"Error: {error_msg[:200]}"
                 )
         
-        # Update conversation history (keep only last 3 exchanges = 6 messages)
-        updated_history = conversation_history.copy() if conversation_history else []
-        updated_history.append({"role": "user", "content": user_message})
-        updated_history.append({"role": "assistant", "content": reply})
+        if summary_task is not None:
+            try:
+                summary = await summary_task
+                conversation_history = conversation_history[-SUMMARY_KEEP_RAW:]
+                logger.info("Compressed history into summary (%d chars)", len(summary))
+            except Exception as e:
+                # Keep the raw messages; summarization is retried next turn
+                logger.warning("History summarization failed: %s: %s", type(e).__name__, e)
         
-        # Keep only last 6 messages (3 exchanges)
-        if len(updated_history) > 6:
-            updated_history = updated_history[-6:]
+        # Update conversation history; the prompt window is chosen by token budget
+        updated_history = _append_exchange(conversation_history, user_message, reply)
         
-        logger.info(f"Returning state with reply length: {len(reply)}, history size: {len(updated_history)}")
+        logger.info("Returning state with reply length: %d, history size: %d", len(reply), len(updated_history))
+        # LangGraph merges partial updates into the state; return only what changed
         return {
-            **state,
             "reply": reply,
-            "conversation_history": updated_history
+            "conversation_history": updated_history,
+            "summary": summary,
         }
 
     graph.add_node("search", decide_search)
     graph.add_node("enrich", enrich_context)
     graph.add_node("reply", generate_reply)
-    graph.set_entry_point("search")
-    graph.add_edge("search", "enrich")
-    graph.add_edge("enrich", "reply")
+    # search and enrich don't depend on each other: fan out from START and
+    # join at reply so their network waits overlap
+    graph.add_edge(START, "search")
+    graph.add_edge(START, "enrich")
+    graph.add_edge(["search", "enrich"], "reply")
     graph.add_edge("reply", END)
 
     return graph
 
 
-def get_agent():
-    # MemorySaver requires a thread_id (we pass per request via configurable)
+_AGENT = None
+_AGENT_LOCK = threading.Lock()
+
+
+def _compile_agent():
+    # The checkpointer requires a thread_id (we pass per request via configurable)
     # Note: If checkpointer causes issues, we can compile without it
+    # The graph is built once; only the compile step is retried in the fallback
+    graph = build_graph()
     try:
-        memory = MemorySaver()
-        graph = build_graph()
+        memory = TTLMemorySaver(ttl=EnvironmentConfig.CHECKPOINT_TTL_HOURS * 3600)
         compiled = graph.compile(checkpointer=memory)
         logger.info("Agent compiled successfully with checkpointer")
         return compiled
     except Exception as e:
-        logger.error(f"Error compiling agent with checkpointer: {e}")
+        logger.error("Error compiling agent with checkpointer: %s", e)
         # Fallback: compile without checkpointer
-        graph = build_graph()
         compiled = graph.compile()
         logger.info("Agent compiled successfully without checkpointer (fallback)")
         return compiled
 
+
+def get_agent():
+    # Compiled once per process and shared by all requests; conversations are
+    # isolated by the thread_id each caller passes via configurable.
+    # After the first call this is a single global read. The lock (double-
+    # checked) stops concurrent first requests from each compiling a graph with
+    # its own checkpointer, which would silently drop one set of conversations.
+    global _AGENT
+    agent = _AGENT
+    if agent is None:
+        with _AGENT_LOCK:
+            if _AGENT is None:
+                _AGENT = _compile_agent()
+            agent = _AGENT
+    return agent
+
+
+async def astream_reply(agent, state: dict, config: dict):
+    """
+    Run the agent and yield ("delta", text) for each reply token as it is
+    generated, then ("final", state) with the completed graph state
+
+    Replies that never touch the LLM (quick replies, cache hits) arrive as a
+    single delta. If a call is retried mid-stream, the final state's reply is
+    authoritative.
+    """
+    final_state: Dict[str, Any] = {}
+    streamed = False
+    async for mode, payload in agent.astream(state, config, stream_mode=["messages", "values"]):
+        if mode == "values":
+            final_state = payload
+            continue
+        chunk, metadata = payload
+        # Only the reply node's tokens; summarization runs without callbacks
+        if metadata.get("langgraph_node") == "reply" and isinstance(chunk.content, str) and chunk.content:
+            streamed = True
+            yield "delta", chunk.content
+    if not streamed and final_state.get("reply"):
+        yield "delta", final_state["reply"]
+    yield "final", final_state
@@ -1,60 +1,212 @@
-from typing import Any, Dict, Optional, List
-from sqlalchemy.orm import Session
+from typing import Any, Dict, Optional
+from sqlalchemy import exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.tables_models import Conversation, FormResponse
+from utiles.cache_utiles import TTLCache, session_cache
+from config.env_config import EnvironmentConfig
+import asyncio
+import functools
 import os
 import logging
 
+try:
+    from tavily import AsyncTavilyClient, TavilyClient
+except ImportError:  # web search is optional; the tools report it as not installed
+    AsyncTavilyClient = TavilyClient = None
+
+__all__ = [
+    "get_user_latest_form_async",
+    "get_conversation_form",
+    "invalidate_user_form",
+    "fetch_weather_context",
+    "fetch_market_context",
+    "fetch_weather_context_async",
+    "fetch_market_context_async",
+    "gather_context",
+    "web_search",
+    "web_search_async",
+]
+
 logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG if EnvironmentConfig.DEBUG else logging.INFO)
+
+# Identical searches within a few minutes (retries, repeated questions across
+# sessions) are answered from memory instead of another Tavily round-trip
+SEARCH_CACHE_TTL = 300
+_search_cache = TTLCache(maxsize=512, ttl=SEARCH_CACHE_TTL)
+
+# A user's form rarely changes within a chat session, so the latest form is
+# kept across requests too; the form routes call invalidate_user_form on writes
+_form_cache = TTLCache(maxsize=EnvironmentConfig.FORM_CACHE_SIZE, ttl=EnvironmentConfig.FORM_CACHE_TTL)
+
+
+# Fields the agent reads from a form; selecting the columns directly skips ORM
+# instance construction and the identity map for what is a read-only lookup,
+# and rows come back as plain tuples zipped straight into dicts
+_FORM_FIELDS = (
+    "id",
+    "user_id",
+    "location",
+    "area_type",
+    "soil_type",
+    "water_source",
+    "irrigation",
+    "temperature",
+    "rainfall",
+    "sunlight",
+    "land_size",
+    "goal",
+    "crop_duration",
+    "specific_crop",
+    "fertilizers_preference",
+    "last_planted_at",
+)
+_FORM_COLUMNS = tuple(getattr(FormResponse, field) for field in _FORM_FIELDS)
+
+
+async def get_user_latest_form_async(db: AsyncSession, user_id: int) -> Dict[str, Any]:
+    """
+    Latest form of the user as a dict ({} if none)
+
+    The result is remembered in the session's request cache (see
+    get_async_db()) and in a short-lived process-wide cache, so most chat turns
+    cost no query at all. The dict is shared and must be treated as read-only.
+    """
+    key = ("latest_form", user_id)
+    cache = session_cache(db)
+    form = cache.get(key)
+    if form is None:
+        form = _form_cache.get(user_id)
+    if form is None:
+        row = (await db.execute(
+            select(*_FORM_COLUMNS)
+            .where(FormResponse.user_id == user_id)
+            .order_by(FormResponse.id.desc())
+            .limit(1)
+        )).first()
+        form = dict(zip(_FORM_FIELDS, row)) if row else {}
+        _form_cache.set(user_id, form)
+    cache[key] = form
+    return form
 
 
-def get_user_latest_form(db: Session, user_id: int) -> Dict[str, Any]:
-    from models.tables_models import FormResponse
+def invalidate_user_form(user_id: int) -> None:
+    """Forget the cached latest form of a user (call after creating/updating/deleting a form)"""
+    _form_cache.pop(user_id)
 
-    form = (
-        db.query(FormResponse)
-        .filter(FormResponse.user_id == user_id)
+
+async def get_conversation_form(db: AsyncSession, user_id: int, conversation_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Latest form of the user if they own the conversation, else None
+
+    The ownership check and the form lookup share one round-trip: the
+    conversation row is LEFT JOINed to the user's newest form. When the form is
+    already cached only an EXISTS is sent. Fills the same caches as
+    get_user_latest_form_async.
+    """
+    form = _form_cache.get(user_id)
+    if form is not None:
+        owned = await db.scalar(
+            select(exists().where(
+                Conversation.id == conversation_id,
+                Conversation.user_id == user_id
+            ))
+        )
+        return form if owned else None
+
+    latest_form_id = (
+        select(FormResponse.id)
+        .where(FormResponse.user_id == user_id)
         .order_by(FormResponse.id.desc())
-        .first()
+        .limit(1)
+        .scalar_subquery()
     )
-    if not form:
-        return {}
-    # Convert SQLAlchemy object to dict
-    return {
-        "id": form.id,
-        "user_id": form.user_id,
-        "location": form.location,
-        "area_type": form.area_type,
-        "soil_type": form.soil_type,
-        "water_source": form.water_source,
-        "irrigation": form.irrigation,
-        "temperature": form.temperature,
-        "rainfall": form.rainfall,
-        "sunlight": form.sunlight,
-        "land_size": form.land_size,
-        "goal": form.goal,
-        "crop_duration": form.crop_duration,
-        "specific_crop": form.specific_crop,
-        "fertilizers_preference": form.fertilizers_preference,
-        "last_planted_at": form.last_planted_at,
-    }
+    row = (await db.execute(
+        select(Conversation.id, *_FORM_COLUMNS)
+        .select_from(Conversation)
+        .outerjoin(FormResponse, FormResponse.id == latest_form_id)
+        .where(
+            Conversation.id == conversation_id,
+            Conversation.user_id == user_id
+        )
+    )).first()
+    if row is None:
+        return None
+    # row[1] is the form id, NULL when the user has no form yet
+    form = dict(zip(_FORM_FIELDS, row[1:])) if row[1] is not None else {}
+    session_cache(db)[("latest_form", user_id)] = form
+    _form_cache.set(user_id, form)
+    return form
+
+
+# Stub content is constant, so it is built once; demand_trends is a shared
+# tuple and must be treated as read-only by callers
+_WEATHER_SUMMARY = "Seasonal outlook suggests moderate temperatures and medium rainfall next 4-6 weeks"
+_DEMAND_TRENDS = (
+    "Wheat demand steady in regional mills",
+    "Pulses prices rising in nearby wholesale markets",
+)
 
 
 def fetch_weather_context(form: Dict[str, Any]) -> Dict[str, Any]:
     # Placeholder for real weather integration; returns a minimal stub
-    return {
-        "location": form.get("location"),
-        "summary": "Seasonal outlook suggests moderate temperatures and medium rainfall next 4-6 weeks",
-    }
+    return {"location": form.get("location"), "summary": _WEATHER_SUMMARY}
 
 
 def fetch_market_context(form: Dict[str, Any]) -> Dict[str, Any]:
     # Placeholder for real market integration; returns a minimal stub
-    goal = form.get("goal", "Profit")
+    return {"goal": form.get("goal", "Profit"), "demand_trends": _DEMAND_TRENDS}
+
+
+async def fetch_weather_context_async(form: Dict[str, Any]) -> Dict[str, Any]:
+    # A real integration awaits its HTTP client here, like web_search_async
+    return fetch_weather_context(form)
+
+
+async def fetch_market_context_async(form: Dict[str, Any]) -> Dict[str, Any]:
+    return fetch_market_context(form)
+
+
+def _format_search_response(query: str, response: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape a raw Tavily response into the payload shown in the frontend"""
+    # Extract relevant information
+    results = []
+    for result in response.get('results', []):
+        results.append({
+            "title": result.get('title', ''),
+            "url": result.get('url', ''),
+            "content": result.get('content', '')[:300] + "...",  # Limit content length
+            "score": result.get('score', 0)
+        })
+    
+    logger.info("Web search completed: %d results found", len(results))
+    
     return {
-        "goal": goal,
-        "demand_trends": [
-            "Wheat demand steady in regional mills",
-            "Pulses prices rising in nearby wholesale markets",
-        ],
+        "success": True,
+        "query": query,
+        "answer": response.get('answer', ''),  # Tavily's AI-generated answer
+        "results": results,
+        "images": response.get('images', [])[:2] if response.get('images') else []
+    }
+
+
+@functools.lru_cache(maxsize=1)
+def _tavily_client(api_key: str):
+    """Tavily client reused across searches (rebuilt only if the key changes)"""
+    return TavilyClient(api_key=api_key)
+
+
+@functools.lru_cache(maxsize=1)
+def _async_tavily_client(api_key: str):
+    return AsyncTavilyClient(api_key=api_key)
+
+
+def _tavily_not_installed() -> Dict[str, Any]:
+    logger.error("Tavily package not installed. Install with: pip install tavily-python")
+    return {
+        "success": False,
+        "error": "Tavily package not installed",
+        "results": []
     }
 
 
@@ -69,10 +221,15 @@ def web_search(query: str, max_results: int = 3) -> Dict[str, Any]:
     Returns:
         Dict with search results and metadata
     """
+    cache_key = (query, max_results)
+    cached = _search_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    if TavilyClient is None:
+        return _tavily_not_installed()
+    
     try:
-        from tavily import TavilyClient
-        from config.env_config import EnvironmentConfig
-        
         tavily_api_key = os.getenv("TAVILY_API_KEY")
         
         if not tavily_api_key:
@@ -83,9 +240,9 @@ def web_search(query: str, max_results: int = 3) -> Dict[str, Any]:
                 "results": []
             }
         
-        logger.info(f"Performing web search for: {query}")
+        logger.info("Performing web search for: %s", query)
         
-        client = TavilyClient(api_key=tavily_api_key)
+        client = _tavily_client(tavily_api_key)
         
         # Perform search
         response = client.search(
@@ -96,37 +253,82 @@ def web_search(query: str, max_results: int = 3) -> Dict[str, Any]:
             include_raw_content=False
         )
         
-        # Extract relevant information
-        results = []
-        for result in response.get('results', []):
-            results.append({
-                "title": result.get('title', ''),
-                "url": result.get('url', ''),
-                "content": result.get('content', '')[:300] + "...",  # Limit content length
-                "score": result.get('score', 0)
-            })
-        
-        logger.info(f"Web search completed: {len(results)} results found")
-        
-        return {
-            "success": True,
-            "query": query,
-            "answer": response.get('answer', ''),  # Tavily's AI-generated answer
-            "results": results,
-            "images": response.get('images', [])[:2] if response.get('images') else []
-        }
+        result = _format_search_response(query, response)
+        # Only successful searches are cached; errors are retried next time
+        _search_cache.set(cache_key, result)
+        return result
         
-    except ImportError:
-        logger.error("Tavily package not installed. Install with: pip install tavily-python")
+    except Exception as e:
+        logger.error("Web search error: %s", e)
         return {
             "success": False,
-            "error": "Tavily package not installed",
+            "error": str(e),
             "results": []
         }
+
+
+async def web_search_async(query: str, max_results: int = 3) -> Dict[str, Any]:
+    """
+    Async variant of web_search for use inside LangGraph nodes
+    
+    Uses Tavily's async client so the event loop is not blocked while
+    waiting on the network. Returns the same payload shape as web_search.
+    """
+    cache_key = (query, max_results)
+    cached = _search_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    if AsyncTavilyClient is None:
+        return _tavily_not_installed()
+    
+    try:
+        tavily_api_key = os.getenv("TAVILY_API_KEY")
+        
+        if not tavily_api_key:
+            logger.warning("TAVILY_API_KEY not found in environment")
+            return {
+                "success": False,
+                "error": "Web search not configured",
+                "results": []
+            }
+        
+        logger.info("Performing web search for: %s", query)
+        
+        client = _async_tavily_client(tavily_api_key)
+        
+        # Perform search
+        response = await client.search(
+            query=query,
+            max_results=max_results,
+            search_depth="basic",
+            include_answer=True,
+            include_raw_content=False
+        )
+        
+        result = _format_search_response(query, response)
+        _search_cache.set(cache_key, result)
+        return result
+        
     except Exception as e:
-        logger.error(f"Web search error: {e}")
+        logger.error("Web search error: %s", e)
         return {
             "success": False,
             "error": str(e),
             "results": []
         }
+
+
+async def gather_context(form: Dict[str, Any], query: Optional[str] = None, max_results: int = 3) -> Dict[str, Any]:
+    """
+    Weather, market and (when query is given) web search context in one call
+    
+    The sources are awaited concurrently, so the call takes as long as the
+    slowest one rather than the sum of all three.
+    """
+    form = form if isinstance(form, dict) else {}
+    sources = [fetch_weather_context_async(form), fetch_market_context_async(form)]
+    if query:
+        sources.append(web_search_async(query, max_results=max_results))
+    weather, market, *web = await asyncio.gather(*sources)
+    return {"weather": weather, "market": market, "web": web[0] if web else {}}
@@ -18,10 +18,13 @@ branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
 
+def _columns_of(table: str) -> set:
+    """Column names of table, from one catalog lookup"""
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
 def upgrade() -> None:
-    bind = op.get_bind()
-    inspector = sa.inspect(bind)
-    cols = [c['name'] for c in inspector.get_columns('form_responses')]
+    cols = _columns_of('form_responses')
 
     if 'user_id' not in cols:
         with op.batch_alter_table('form_responses', schema=None) as batch_op:
@@ -35,9 +38,7 @@ def upgrade() -> None:
 
 
 def downgrade() -> None:
-    bind = op.get_bind()
-    inspector = sa.inspect(bind)
-    cols = [c['name'] for c in inspector.get_columns('form_responses')]
+    cols = _columns_of('form_responses')
 
     if 'user_id' in cols:
         # Drop index and FK, then column
@@ -0,0 +1,27 @@
+"""add (user_id, id) index to form_responses
+
+Revision ID: b7c3d2e1f0a9
+Revises: 09a070257b1c
+Create Date: 2026-10-14 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7c3d2e1f0a9'
+down_revision: Union[str, Sequence[str], None] = '09a070257b1c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Lets "latest form for a user" (ORDER BY id DESC LIMIT 1) read a single
+    # index entry; Postgres scans the ascending index backwards for DESC
+    op.create_index('ix_form_responses_user_id_id', 'form_responses', ['user_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_form_responses_user_id_id', table_name='form_responses')
@@ -0,0 +1,30 @@
+"""add sort indexes to conversations and messages
+
+Revision ID: c4e8f1a2b3d6
+Revises: b7c3d2e1f0a9
+Create Date: 2026-10-14 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8f1a2b3d6'
+down_revision: Union[str, Sequence[str], None] = 'b7c3d2e1f0a9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Last message per conversation (ORDER BY created_at DESC LIMIT 1 and the
+    # ROW_NUMBER window) and a user's conversation list (ORDER BY updated_at
+    # DESC) both read these in index order; Postgres scans them backwards for DESC
+    op.create_index('ix_messages_conversation_id_created_at', 'messages', ['conversation_id', 'created_at'], unique=False)
+    op.create_index('ix_conversations_user_id_updated_at', 'conversations', ['user_id', 'updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_conversations_user_id_updated_at', table_name='conversations')
+    op.drop_index('ix_messages_conversation_id_created_at', table_name='messages')
@@ -0,0 +1,32 @@
+"""cascade message deletes from conversations
+
+Revision ID: d5f9a3b4c7e8
+Revises: c4e8f1a2b3d6
+Create Date: 2026-10-14 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5f9a3b4c7e8'
+down_revision: Union[str, Sequence[str], None] = 'c4e8f1a2b3d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Postgres' default name for the unnamed FK created in 09a070257b1c
+FK_NAME = 'messages_conversation_id_fkey'
+
+
+def upgrade() -> None:
+    # Deleting a conversation removes its messages in the database itself, so
+    # the ORM (passive_deletes=True) no longer loads and deletes them row by row
+    op.drop_constraint(FK_NAME, 'messages', type_='foreignkey')
+    op.create_foreign_key(FK_NAME, 'messages', 'conversations', ['conversation_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    op.drop_constraint(FK_NAME, 'messages', type_='foreignkey')
+    op.create_foreign_key(FK_NAME, 'messages', 'conversations', ['conversation_id'], ['id'])
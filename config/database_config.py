@@ -1,6 +1,6 @@
 import os
 from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 from config.env_config import EnvironmentConfig
@@ -20,30 +20,36 @@ async_url = DATABASE_URL
 if not async_url.startswith("postgresql+asyncpg://"):
     async_url = async_url.replace("postgresql://", "postgresql+asyncpg://")
 
-# Create async database engine for OpenAI Agents SDK
-async_engine = create_async_engine(
-    async_url,
-    echo=EnvironmentConfig.DEBUG,
+# Shared engine settings: a larger compiled-statement cache so the handful of
+# hot queries are compiled once, and a pool sized for concurrent requests.
+# SQL logging formats every statement, so it has its own switch (SQL_ECHO)
+# rather than following DEBUG.
+_ENGINE_OPTIONS = dict(
+    echo=EnvironmentConfig.SQL_ECHO,
+    query_cache_size=1200,
+    pool_size=EnvironmentConfig.DB_POOL_SIZE,
+    max_overflow=EnvironmentConfig.DB_MAX_OVERFLOW,
+    pool_timeout=EnvironmentConfig.DB_POOL_TIMEOUT,
     pool_pre_ping=True,
+    pool_recycle=EnvironmentConfig.DB_POOL_RECYCLE,
 )
 
+# Create async database engine for OpenAI Agents SDK
+async_engine = create_async_engine(async_url, **_ENGINE_OPTIONS)
+
 # Create sync database engine for regular operations - ensure it uses psycopg2
 sync_url = DATABASE_URL
 if sync_url.startswith("postgresql+asyncpg://"):
     sync_url = sync_url.replace("postgresql+asyncpg://", "postgresql://")
-sync_engine = create_engine(
-    sync_url,
-    echo=EnvironmentConfig.DEBUG,
-    pool_pre_ping=True,
-    pool_recycle=300,
-)
+sync_engine = create_engine(sync_url, **_ENGINE_OPTIONS)
 
 # Create session factories
-AsyncSessionLocal = sessionmaker(
-    class_=AsyncSession,
-    autocommit=False,
+# expire_on_commit=False: in async code an expired attribute can't lazily
+# reload, so objects stay readable after commit (e.g. to build the response)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
     autoflush=False,
-    bind=async_engine
+    expire_on_commit=False,
 )
 
 SessionLocal = sessionmaker(
@@ -58,4 +64,11 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    """Dependency to get an async database session (for async endpoints)"""
+    async with AsyncSessionLocal() as db:
+        # Request-scoped cache, read and primed by the async helpers in agent.tools
+        db.info["cache"] = {}
+        yield db
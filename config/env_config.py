@@ -1,3 +1,4 @@
+import functools
 import os
 from dotenv import load_dotenv
 from typing import Optional
@@ -15,19 +16,49 @@ class EnvironmentConfig:
     # Database Configuration
     DATABASE_URL: str = os.getenv("DATABASE_URL", "")
     NEON_DATABASE_URL: str = os.getenv("NEON_DATABASE_URL", "")
+    # Connection pool per engine (async and sync each get one)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "20"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    # Seconds a request waits for a free connection before failing
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    # Seconds before a pooled connection is replaced (Neon drops idle ones after ~5 min)
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "300"))
     
     # API Keys for Climate Data
     OPENWEATHER_API_KEY: str = os.getenv("OPENWEATHER_API_KEY", "")
     AIRVISUAL_API_KEY: str = os.getenv("AIRVISUAL_API_KEY", "")
     
+    # Agent Configuration
+    # Approximate token budget for the conversation history included in each prompt
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "2000"))
+    
+    # Max Gemini calls per second across all sessions (0 = unlimited)
+    LLM_RATE_LIMIT: float = float(os.getenv("LLM_RATE_LIMIT", "0"))
+    # Max Gemini calls in flight at once (0 = unlimited)
+    LLM_CONCURRENCY: int = int(os.getenv("LLM_CONCURRENCY", "8"))
+    
+    # Seconds a user's latest form is reused across requests. Writes invalidate it
+    # in the worker that handled them; other workers see the change after the TTL
+    FORM_CACHE_TTL: int = int(os.getenv("FORM_CACHE_TTL", "60"))
+    FORM_CACHE_SIZE: int = int(os.getenv("FORM_CACHE_SIZE", "50000"))
+    
+    # Hours an idle conversation thread is kept in the agent's checkpointer
+    CHECKPOINT_TTL_HOURS: float = float(os.getenv("CHECKPOINT_TTL_HOURS", "24"))
+    
+    # Seconds before a single Gemini request is abandoned
+    GEMINI_TIMEOUT: float = float(os.getenv("GEMINI_TIMEOUT", "30"))
+    
     # Application Configuration
     APP_NAME: str = os.getenv("APP_NAME", "ReGenAI")
     APP_VERSION: str = os.getenv("APP_VERSION", "1.0.0")
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
+    # Log every SQL statement (development only; independent of DEBUG)
+    SQL_ECHO: bool = os.getenv("SQL_ECHO", "False").lower() == "true"
     
     @classmethod
+    @functools.lru_cache(maxsize=1)
     def get_database_url(cls) -> str:
-        """Get the primary database URL, preferring Neon if available"""
+        """Get the primary database URL, preferring Neon if available (resolved once per process)"""
         return cls.NEON_DATABASE_URL if cls.NEON_DATABASE_URL else cls.DATABASE_URL
     
     @classmethod
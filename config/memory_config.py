@@ -1,25 +1,20 @@
 import uuid
-from typing import Optional
-from sqlalchemy.ext.asyncio import create_async_engine
-from agents.extensions.memory import SQLAlchemySession
-from config.env_config import EnvironmentConfig
+from typing import TYPE_CHECKING, Optional
+from config.database_config import async_engine
+
+if TYPE_CHECKING:
+    from agents.extensions.memory import SQLAlchemySession
 
 class MemoryManager:
     """Memory management system for ReGenAI using PostgreSQL and UUID-based user identification"""
     
     def __init__(self):
-        self.engine = None
-        self._initialize_engine()
-    
-    def _initialize_engine(self):
-        """Initialize the async database engine for memory management"""
-        database_url = EnvironmentConfig.get_database_url()
-        if not database_url:
-            raise ValueError("Database URL not configured")
-        
-        self.engine = create_async_engine(database_url, echo=EnvironmentConfig.DEBUG)
+        # Shares the application's async engine (and its connection pool)
+        # rather than opening a second pool to the same database; the engine
+        # is disposed by the app's lifespan on shutdown
+        self.engine = async_engine
     
-    def create_session(self, user_id: Optional[str] = None) -> SQLAlchemySession:
+    def create_session(self, user_id: Optional[str] = None) -> "SQLAlchemySession":
         """
         Create a SQLAlchemySession for a user
         
@@ -29,6 +24,10 @@ class MemoryManager:
         Returns:
             SQLAlchemySession configured for the user
         """
+        # Imported on first use: the agents SDK pulls in openai and its own
+        # pydantic models, which nothing else at startup needs
+        from agents.extensions.memory import SQLAlchemySession
+        
         if user_id is None:
             user_id = str(uuid.uuid4())
         
@@ -41,11 +40,6 @@ class MemoryManager:
     def generate_user_id(self) -> str:
         """Generate a new UUID for user identification"""
         return str(uuid.uuid4())
-    
-    async def cleanup(self):
-        """Clean up database connections"""
-        if self.engine:
-            await self.engine.dispose()
 
 # Global memory manager instance
 memory_manager = MemoryManager()
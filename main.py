@@ -1,11 +1,49 @@
+from contextlib import asynccontextmanager
+import asyncio
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 from routes.auth_routes import router as auth_router
 from routes.forme_routes import router as forms_router
 from routes.agent_routes import router as agent_router
 from routes.chat_routes import router as chat_router
+from config.database_config import async_engine, sync_engine
+from agent.main_agent import get_agent
 
-app = FastAPI(title="RegenAI API", version="1.0.0")
+try:  # orjson ships with fastapi[all]; fall back to the stdlib if it's missing
+    import orjson
+except ImportError:
+    orjson = None
+
+# Render JSON with orjson (C, several times faster than the stdlib encoder on
+# long message lists) when it is installed
+DEFAULT_RESPONSE_CLASS = ORJSONResponse if orjson is not None else JSONResponse
+
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Compile the agent (and create the Gemini client) before the first request,
+    # off the event loop; without an API key the routes report it as before
+    try:
+        await asyncio.to_thread(get_agent)
+    except Exception as e:
+        logger.warning("Agent not warmed at startup: %s", e)
+    yield
+    # Close pooled connections on shutdown; both engines are process-wide singletons
+    await async_engine.dispose()
+    sync_engine.dispose()
+
+
+app = FastAPI(
+    title="RegenAI API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=DEFAULT_RESPONSE_CLASS,
+)
 
 # CORS middleware to allow frontend connection
 app.add_middleware(
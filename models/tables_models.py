@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -24,6 +24,10 @@ class Todo(Base):
 
 class FormResponse(Base):
     __tablename__ = 'form_responses'
+    __table_args__ = (
+        # Latest form per user: WHERE user_id = ? ORDER BY id DESC LIMIT 1
+        Index('ix_form_responses_user_id_id', 'user_id', 'id'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
     location = Column(String, nullable=False)  # District / City / Village
@@ -45,6 +49,10 @@ class FormResponse(Base):
 
 class Conversation(Base):
     __tablename__ = 'conversations'
+    __table_args__ = (
+        # A user's conversations, most recently updated first
+        Index('ix_conversations_user_id_updated_at', 'user_id', 'updated_at'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     title = Column(String(255), nullable=False)
@@ -53,13 +61,19 @@ class Conversation(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
+    # passive_deletes: ON DELETE CASCADE removes the messages, the ORM doesn't load them.
+    # lazy="raise": load them explicitly (selectinload) rather than by accident
+    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan", passive_deletes=True, order_by="Message.created_at", lazy="raise")
     user = relationship("User")
 
 class Message(Base):
     __tablename__ = 'messages'
+    __table_args__ = (
+        # Messages of a conversation in order, and its latest message
+        Index('ix_messages_conversation_id_created_at', 'conversation_id', 'created_at'),
+    )
     id = Column(Integer, primary_key=True, index=True)
-    conversation_id = Column(Integer, ForeignKey('conversations.id'), nullable=False)
+    conversation_id = Column(Integer, ForeignKey('conversations.id', ondelete='CASCADE'), nullable=False)
     sender = Column(String(20), nullable=False)  # 'user' or 'agent'
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -1,14 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from uuid import uuid4
 import logging
-from agent.tools import get_user_latest_form
+from agent.tools import get_user_latest_form_async
 
-from config.database_config import get_db
-from routes.auth_routes import get_current_user
+from config.database_config import get_async_db
+from routes.auth_routes import get_current_user_async
 from models.tables_models import User
-from agent.main_agent import get_agent
+from agent.main_agent import get_agent, astream_reply
+from utiles.sse_utiles import SSE_HEADERS, sse_delta, sse_pack
 
 logger = logging.getLogger(__name__)
 
@@ -28,27 +30,29 @@ class ChatResponse(BaseModel):
 
 
 @router.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def chat(req: ChatRequest, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user_async)):
     thread_id = req.thread_id or str(uuid4())
     
     try:
-        logger.info(f"Chat request from user {current_user.id}: {req.message[:50]}...")
+        logger.info("Chat request from user %s: %s...", current_user.id, req.message[:50])
         
         # Initialize agent
         agent = get_agent()
         
         # Fetch latest form now (avoid passing DB session into LangGraph state)
-        form = get_user_latest_form(db, current_user.id)
-        logger.info(f"User form data retrieved: {bool(form)}")
+        form = await get_user_latest_form_async(db, current_user.id)
+        logger.info("User form data retrieved: %s", bool(form))
+        # Nothing below touches the DB; don't hold a pooled connection during the LLM call
+        await db.close()
         
         # Get previous conversation history from checkpointer
         config = {"configurable": {"thread_id": thread_id}}
         try:
-            previous_state = agent.get_state(config)
+            previous_state = await agent.aget_state(config)
             previous_history = previous_state.values.get("conversation_history", []) if previous_state and previous_state.values else []
-            logger.info(f"Loaded previous history: {len(previous_history)} messages")
+            logger.info("Loaded previous history: %d messages", len(previous_history))
         except Exception as e:
-            logger.warning(f"Could not load previous state: {e}")
+            logger.warning("Could not load previous state: %s", e)
             previous_history = []
         
         state = {
@@ -59,20 +63,20 @@ def chat(req: ChatRequest, db: Session = Depends(get_db), current_user: User = D
         }
         
         # Invoke agent
-        logger.info(f"Invoking agent with state keys: {list(state.keys())}, history size: {len(previous_history)}")
+        logger.info("Invoking agent with state keys: %s, history size: %d", list(state), len(previous_history))
         
         # LangGraph with checkpointer returns the final state
         # Try different invocation methods
         try:
-            result = agent.invoke(state, {"configurable": {"thread_id": thread_id}})
-            logger.info(f"Agent invoke returned: type={type(result)}")
+            result = await agent.ainvoke(state, {"configurable": {"thread_id": thread_id}})
+            logger.info("Agent invoke returned: type=%s", type(result))
             
             # If result is None, try streaming and get last value
             if result is None:
-                logger.warning("invoke returned None, trying stream method")
+                logger.warning("ainvoke returned None, trying stream method")
                 final_state = None
-                for chunk in agent.stream(state, {"configurable": {"thread_id": thread_id}}):
-                    logger.info(f"Stream chunk: {chunk}")
+                async for chunk in agent.astream(state, {"configurable": {"thread_id": thread_id}}):
+                    logger.debug("Stream chunk: %r", chunk)
                     final_state = chunk
                 result = final_state
             
@@ -81,32 +85,32 @@ def chat(req: ChatRequest, db: Session = Depends(get_db), current_user: User = D
                 raise RuntimeError("Agent returned None - check graph configuration")
             
             if not isinstance(result, dict):
-                logger.error(f"Agent returned invalid response type: {type(result)}, value: {result}")
+                logger.error("Agent returned invalid response type: %s, value: %s", type(result), result)
                 raise RuntimeError(f"Agent returned invalid response type: {type(result)}")
             
             reply = result.get("reply")
             if not reply:
-                logger.error(f"No reply in result. Result keys: {list(result.keys())}")
+                logger.error("No reply in result. Result keys: %s", list(result.keys()))
                 raise RuntimeError("No reply generated by agent")
         except Exception as invoke_error:
-            logger.error(f"Error during agent invocation: {invoke_error}", exc_info=True)
+            logger.error("Error during agent invocation: %s", invoke_error, exc_info=True)
             raise
         
         # Get search results if available
         search_results = result.get("search_results", {})
         
-        logger.info(f"Agent reply generated successfully: {len(reply)} chars, search performed: {bool(search_results.get('success'))}")
+        logger.info("Agent reply generated successfully: %d chars, search performed: %s", len(reply), bool(search_results.get('success')))
         return ChatResponse(reply=reply, thread_id=thread_id, search_results=search_results)
         
     except ValueError as e:
         # API key or configuration error
-        logger.error(f"Configuration error: {e}")
+        logger.error("Configuration error: %s", e)
         reply = f"Configuration error: {str(e)}"
         return ChatResponse(reply=reply, thread_id=thread_id)
         
     except Exception as e:
         # Log server-side and return a graceful message
-        logger.error(f"Agent error: {type(e).__name__}: {str(e)}", exc_info=True)
+        logger.error("Agent error: %s: %s", type(e).__name__, e, exc_info=True)
         reply = (
             "I had an issue generating a reply just now. Please try again. "
             "If this keeps happening, check AI credentials and database connectivity. "
@@ -115,3 +119,51 @@ def chat(req: ChatRequest, db: Session = Depends(get_db), current_user: User = D
         return ChatResponse(reply=reply, thread_id=thread_id)
 
 
+@router.post("/chat/stream")
+async def chat_stream(req: ChatRequest, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user_async)):
+    """Same as /agent/chat but streams the reply as text/event-stream 'delta' events while it is generated"""
+    thread_id = req.thread_id or str(uuid4())
+    config = {"configurable": {"thread_id": thread_id}}
+    logger.info("Streaming chat request from user %s: %s...", current_user.id, req.message[:50])
+    
+    # Resolve everything that needs the DB session before the response starts
+    form = await get_user_latest_form_async(db, current_user.id)
+    # get_async_db only closes the session after the stream ends; release it now
+    await db.close()
+    
+    async def generator():
+        yield sse_pack('start', {'thread_id': thread_id})
+        search_results = {}
+        try:
+            agent = get_agent()
+            try:
+                previous_state = await agent.aget_state(config)
+                previous_history = previous_state.values.get("conversation_history", []) if previous_state and previous_state.values else []
+            except Exception as e:
+                logger.warning("Could not load previous state: %s", e)
+                previous_history = []
+            
+            state = {
+                "user_id": current_user.id,
+                "form": form,
+                "message": req.message,
+                "conversation_history": previous_history,
+            }
+            reply = ""
+            async for kind, payload in astream_reply(agent, state, config):
+                if kind == "delta":
+                    yield sse_delta(payload)
+                else:
+                    reply = payload.get("reply", "")
+                    search_results = payload.get("search_results", {})
+        except Exception as e:
+            logger.error("Agent streaming error: %s: %s", type(e).__name__, e, exc_info=True)
+            reply = (
+                "I had an issue generating a reply just now. Please try again. "
+                f"Error: {str(e)[:100]}"
+            )
+            yield sse_delta(reply)
+        
+        yield sse_pack('end', {'thread_id': thread_id, 'reply': reply, 'search_results': search_results})
+    
+    return StreamingResponse(generator(), media_type="text/event-stream", headers=SSE_HEADERS)
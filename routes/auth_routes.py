@@ -1,32 +1,45 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError
 from models.tables_models import User
 from utiles.schemas import UserRegister, UserLogin, Token, UserResponse
-from utiles.jwt_utiles import verify_password, get_password_hash, create_access_token, verify_token
-from config.database_config import get_db
+from utiles.jwt_utiles import verify_password, password_needs_rehash, get_password_hash, create_access_token, verify_token
+from config.database_config import get_db, get_async_db
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials"
     )
-    
+
+def _token_user_id(token: str) -> int:
     try:
         payload = verify_token(token)
         user_id: str = payload.get("sub")
         if user_id is None:
-            raise credentials_exception
+            raise _credentials_exception()
     except JWTError:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.id == int(user_id)).first()
+        raise _credentials_exception()
+    return int(user_id)
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    # Primary-key get: answered from the session's identity map if this
+    # request already loaded the user
+    user = db.get(User, _token_user_id(token))
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    return user
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    """get_current_user for async endpoints; shares the endpoint's AsyncSession"""
+    user = await db.get(User, _token_user_id(token))
+    if user is None:
+        raise _credentials_exception()
     return user
 
 @router.post("/register", response_model=Token)
@@ -67,6 +80,11 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
             detail="Incorrect email or password"
         )
     
+    # Upgrade legacy SHA-256 hashes while we have the plain password
+    if password_needs_rehash(db_user.hashed_password):
+        db_user.hashed_password = get_password_hash(user.password)
+        db.commit()
+    
     # Create token
     access_token = create_access_token(data={"sub": str(db_user.id)})
     
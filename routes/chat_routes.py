@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from typing import List
+from pydantic import TypeAdapter
+from sqlalchemy import and_, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload, selectinload
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
 from models.tables_models import User, Conversation, Message
 from utiles.schemas import (
     ConversationCreate, 
@@ -11,24 +14,89 @@ from utiles.schemas import (
     MessageResponse,
     ConversationTitleUpdate
 )
-from routes.auth_routes import get_current_user
-from config.database_config import get_db
+from routes.auth_routes import get_current_user_async
+from config.database_config import get_async_db
 from datetime import datetime
-from agent.main_agent import get_agent
-from agent.tools import get_user_latest_form
-from uuid import uuid4
-import json
-import time
-import traceback
+from agent.main_agent import get_agent, astream_reply
+from agent.tools import get_conversation_form
+from utiles.sse_utiles import SSE_HEADERS, sse_delta, sse_pack
+from utiles.cache_utiles import TTLCache
+import asyncio
+import logging
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Rendered list/detail responses, keyed by a cheap validator query's result
+# (conversation updated_at values), so any write that bumps updated_at, or
+# adds/removes a conversation, naturally misses the old entry
+_conversations_cache = TTLCache(maxsize=1024, ttl=60)
+_conversation_cache = TTLCache(maxsize=1024, ttl=60)
+
+# Validates a whole list of conversation rows in one pydantic-core call
+_conversation_list_adapter = TypeAdapter(List[ConversationResponse])
+
+# Replies already produced for an Idempotency-Key, so a client retrying a POST
+# after a network blip gets the same messages back instead of a second turn
+_idempotent_replies = TTLCache(maxsize=4096, ttl=600)
+# Keys whose turn is still running; a retry that arrives before the first
+# attempt finishes waits on its future instead of calling the agent again
+_inflight_replies: Dict[Hashable, asyncio.Future] = {}
+
+
+async def _run_idempotent(replay_key: Optional[Hashable], produce: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Await produce() at most once per replay_key and share its result
+    
+    Both maps live in process memory, so deduplication only holds within one
+    worker: with uvicorn --workers N, a retry routed to another worker still
+    runs a second turn. A failed attempt is not remembered, so the next retry
+    runs again.
+    """
+    if replay_key is None:
+        return await produce()
+    cached = _idempotent_replies.get(replay_key)
+    if cached is not None:
+        return cached
+    pending = _inflight_replies.get(replay_key)
+    if pending is not None:
+        # Shielded so a waiter giving up doesn't cancel the attempt it waits on
+        return await asyncio.shield(pending)
+    
+    future = asyncio.get_running_loop().create_future()
+    _inflight_replies[replay_key] = future
+    try:
+        result = await produce()
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # mark retrieved, there may be no waiters
+        raise
+    except BaseException:
+        future.cancel()
+        raise
+    else:
+        _idempotent_replies.set(replay_key, result)
+        future.set_result(result)
+        return result
+    finally:
+        _inflight_replies.pop(replay_key, None)
+
+
+async def _touch_conversation(db: AsyncSession, conversation_id: int, at: datetime) -> None:
+    # Bump updated_at with a plain UPDATE, without loading the conversation.
+    # Callers pass the timestamp they also stamp the message with, so the two match
+    await db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(updated_at=at)
+    )
 
 # Create a new conversation
 @router.post("/conversations", response_model=ConversationResponse)
-def create_conversation(
+async def create_conversation(
     conversation: ConversationCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new conversation for the current user"""
     db_conversation = Conversation(
@@ -37,8 +105,8 @@ def create_conversation(
         conversation_type=conversation.conversation_type
     )
     db.add(db_conversation)
-    db.commit()
-    db.refresh(db_conversation)
+    await db.commit()
+    await db.refresh(db_conversation)
     
     return ConversationResponse(
         id=db_conversation.id,
@@ -53,47 +121,93 @@ def create_conversation(
 
 # Get all conversations for current user
 @router.get("/conversations", response_model=List[ConversationResponse])
-def get_conversations(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_conversations(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all conversations for the current user"""
-    conversations = db.query(Conversation).filter(
-        Conversation.user_id == current_user.id
-    ).order_by(Conversation.updated_at.desc()).all()
-    
-    result = []
-    for conv in conversations:
-        # Get last message
-        last_message = db.query(Message).filter(
-            Message.conversation_id == conv.id
-        ).order_by(Message.created_at.desc()).first()
-        
-        result.append(ConversationResponse(
-            id=conv.id,
-            user_id=conv.user_id,
-            title=conv.title,
-            conversation_type=conv.conversation_type,
-            created_at=conv.created_at,
-            updated_at=conv.updated_at,
-            last_message=last_message.content if last_message else None,
-            unread_count=0  # Can implement read/unread logic later
-        ))
+    # Count as well as max(updated_at): deleting an older conversation
+    # doesn't move the max
+    latest_update, conversation_count = (await db.execute(
+        select(func.max(Conversation.updated_at), func.count(Conversation.id)).where(
+            Conversation.user_id == current_user.id
+        )
+    )).one()
+    cache_key = (current_user.id, latest_update, conversation_count)
+    cached = _conversations_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Latest message per conversation, ranked in the same statement instead of
+    # one query per conversation; limited to this user's conversations
+    user_conversation_ids = select(Conversation.id).where(Conversation.user_id == current_user.id)
+    latest = (
+        select(
+            Message.conversation_id,
+            Message.content,
+            func.row_number().over(
+                partition_by=Message.conversation_id,
+                order_by=Message.created_at.desc()
+            ).label("rn")
+        )
+        .where(Message.conversation_id.in_(user_conversation_ids))
+        .subquery()
+    )
+    # Plain column rows rather than ORM objects: no identity map or instance
+    # state for what is read-only, and columns added to the model later
+    # don't get pulled into every list request
+    rows = (await db.execute(
+        select(
+            Conversation.id,
+            Conversation.user_id,
+            Conversation.title,
+            Conversation.conversation_type,
+            Conversation.created_at,
+            Conversation.updated_at,
+            latest.c.content.label("last_message")
+        ).outerjoin(
+            latest,
+            and_(latest.c.conversation_id == Conversation.id, latest.c.rn == 1)
+        ).where(
+            Conversation.user_id == current_user.id
+        ).order_by(Conversation.updated_at.desc())
+    )).mappings().all()
     
+    # unread_count keeps its default of 0; can implement read/unread logic later
+    result = _conversation_list_adapter.validate_python(rows)
+    _conversations_cache.set(cache_key, result)
     return result
 
 # Get a specific conversation with all messages
 @router.get("/conversations/{conversation_id}", response_model=ConversationWithMessages)
-def get_conversation(
+async def get_conversation(
     conversation_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific conversation with all its messages"""
-    conversation = db.query(Conversation).filter(
-        Conversation.id == conversation_id,
-        Conversation.user_id == current_user.id
-    ).first()
+    updated_at = await db.scalar(
+        select(Conversation.updated_at).where(
+            Conversation.id == conversation_id,
+            Conversation.user_id == current_user.id
+        )
+    )
+    cache_key = (current_user.id, conversation_id, updated_at)
+    cached = _conversation_cache.get(cache_key) if updated_at is not None else None
+    if cached is not None:
+        return cached
+
+    # Messages arrive with the conversation (ordered by the relationship);
+    # any other lazy load on this path raises instead of silently querying
+    conversation = await db.scalar(
+        select(Conversation).options(
+            selectinload(Conversation.messages),
+            raiseload("*")
+        ).where(
+            Conversation.id == conversation_id,
+            Conversation.user_id == current_user.id
+        )
+    )
     
     if not conversation:
         raise HTTPException(
@@ -101,59 +215,45 @@ def get_conversation(
             detail="Conversation not found"
         )
     
-    messages = db.query(Message).filter(
-        Message.conversation_id == conversation_id
-    ).order_by(Message.created_at.asc()).all()
-    
-    return ConversationWithMessages(
-        id=conversation.id,
-        user_id=conversation.user_id,
-        title=conversation.title,
-        conversation_type=conversation.conversation_type,
-        created_at=conversation.created_at,
-        updated_at=conversation.updated_at,
-        messages=[MessageResponse(
-            id=msg.id,
-            conversation_id=msg.conversation_id,
-            sender=msg.sender,
-            content=msg.content,
-            created_at=msg.created_at
-        ) for msg in messages]
-    )
+    # from_attributes validation walks the loaded ORM objects (messages
+    # included) in pydantic-core, with no per-message Python copy first
+    result = ConversationWithMessages.model_validate(conversation)
+    _conversation_cache.set((current_user.id, conversation_id, conversation.updated_at), result)
+    return result
 
 # Send a message (user message + AI response)
 @router.post("/messages", response_model=List[MessageResponse])
-def send_message(
+async def send_message(
     message_data: MessageCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """Send a message and get AI response"""
-    # Verify conversation belongs to user
-    conversation = db.query(Conversation).filter(
-        Conversation.id == message_data.conversation_id,
-        Conversation.user_id == current_user.id
-    ).first()
-    
-    if not conversation:
+    replay_key = (current_user.id, idempotency_key) if idempotency_key else None
+    return await _run_idempotent(replay_key, lambda: _answer_message(message_data, current_user, db))
+
+
+async def _answer_message(message_data: MessageCreate, current_user: User, db: AsyncSession) -> List[MessageResponse]:
+    # Verify conversation belongs to user; the user's form comes back with it
+    form = await get_conversation_form(db, current_user.id, message_data.conversation_id)
+    if form is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
     
-    # Create user message
-    user_message = Message(
-        conversation_id=message_data.conversation_id,
-        sender='user',
-        content=message_data.content
-    )
-    db.add(user_message)
+    # Give the connection back to the pool for the seconds the LLM takes;
+    # the inserts below check out a fresh one
+    await db.close()
+    
+    # Timestamp the user message when it arrives, not when it is written
+    user_created_at = datetime.utcnow()
     
     # Generate AI response using real agent
     try:
         agent = get_agent()
         thread_id = f"conv_{message_data.conversation_id}"
-        form = get_user_latest_form(db, current_user.id)
         
         state = {
             "user_id": current_user.id,
@@ -161,202 +261,228 @@ def send_message(
             "message": message_data.content,
         }
         
-        result = agent.invoke(state, {"configurable": {"thread_id": thread_id}})
+        result = await agent.ainvoke(state, {"configurable": {"thread_id": thread_id}})
         ai_response_text = result.get("reply", "I'm here to help, but I couldn't generate a response.")
-    except Exception as e:
-        print(f"Error calling agent: {e}")
+    except Exception:
+        logger.exception("Error calling agent for user %s", current_user.id)
         ai_response_text = "I apologize, but I'm having trouble processing your request. Please try again."
     
-    # Create AI message
-    ai_message = Message(
-        conversation_id=message_data.conversation_id,
-        sender='agent',
-        content=ai_response_text
-    )
-    db.add(ai_message)
+    replied_at = datetime.utcnow()
+    # Write both messages in one INSERT ... RETURNING instead of two inserts
+    # followed by a refresh SELECT each
+    message_rows = [
+        {
+            "conversation_id": message_data.conversation_id,
+            "sender": 'user',
+            "content": message_data.content,
+            "created_at": user_created_at,
+        },
+        {
+            "conversation_id": message_data.conversation_id,
+            "sender": 'agent',
+            "content": ai_response_text,
+            "created_at": replied_at,
+        },
+    ]
+    inserted = (await db.execute(
+        insert(Message).returning(Message.id, sort_by_parameter_order=True),
+        message_rows
+    )).scalars().all()
     
     # Update conversation timestamp
-    conversation.updated_at = datetime.utcnow()
+    await _touch_conversation(db, message_data.conversation_id, replied_at)
     
-    db.commit()
-    db.refresh(user_message)
-    db.refresh(ai_message)
+    await db.commit()
     
     return [
-        MessageResponse(
-            id=user_message.id,
-            conversation_id=user_message.conversation_id,
-            sender=user_message.sender,
-            content=user_message.content,
-            created_at=user_message.created_at
-        ),
-        MessageResponse(
-            id=ai_message.id,
-            conversation_id=ai_message.conversation_id,
-            sender=ai_message.sender,
-            content=ai_message.content,
-            created_at=ai_message.created_at
-        )
+        MessageResponse(id=message_id, **row)
+        for message_id, row in zip(inserted, message_rows)
     ]
 
 # Stream a message (user message + streamed AI response)
 @router.post("/messages/stream")
-def send_message_stream(
+async def send_message_stream(
     message_data: MessageCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Send a message and stream the AI response as text/event-stream.
     Frontend can read with fetch() and incrementally render 'delta' events.
     """
-    # Verify conversation belongs to user
-    conversation = db.query(Conversation).filter(
-        Conversation.id == message_data.conversation_id,
-        Conversation.user_id == current_user.id
-    ).first()
-
-    if not conversation:
+    # Verify conversation belongs to user; the user's form comes back with it
+    form = await get_conversation_form(db, current_user.id, message_data.conversation_id)
+    if form is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
 
-    # Create user message immediately
-    user_message = Message(
-        conversation_id=message_data.conversation_id,
-        sender='user',
-        content=message_data.content
-    )
-    db.add(user_message)
-    db.commit()
-    db.refresh(user_message)
-
-    def sse_pack(event: str, data: dict) -> str:
-        return f"data: {json.dumps({'event': event, 'data': data})}\n\n"
-
-    def generator():
-        # Notify start
-        yield sse_pack('start', {
-            'user_message_id': user_message.id,
-            'conversation_id': user_message.conversation_id
-        })
+    thread_id = f"conv_{message_data.conversation_id}"
+    state = {
+        "user_id": current_user.id,
+        "form": form,
+        "message": message_data.content,
+    }
+
+    # Start the agent before writing the user message: the insert/commit then
+    # overlaps with the model working on its first token instead of delaying it.
+    # History for the reply comes from the agent's checkpointer, not Postgres.
+    events: asyncio.Queue = asyncio.Queue()
 
-        # Invoke agent and get full reply; stream in chunks to client
+    async def produce():
         try:
-            agent = get_agent()
-            thread_id = f"conv_{message_data.conversation_id}"
-            form = get_user_latest_form(db, current_user.id)
-            
-            print(f"[AGENT] Calling agent for user {current_user.id}, thread {thread_id}")
-            print(f"[AGENT] Form data: {form}")
-            print(f"[AGENT] Message: {message_data.content}")
-            
-            state = {
-                "user_id": current_user.id,
-                "form": form,
-                "message": message_data.content,
-            }
-            result = agent.invoke(state, {"configurable": {"thread_id": thread_id}})
-            ai_response_text = result.get("reply", "I'm here to help, but I couldn't generate a response.")
-            
-            print(f"[AGENT] Success! Response length: {len(ai_response_text)} chars")
+            logger.debug("Calling agent for user %s, thread %s", current_user.id, thread_id)
+            async for event in astream_reply(get_agent(), state, {"configurable": {"thread_id": thread_id}}):
+                await events.put(event)
         except Exception as e:
-            print(f"[AGENT ERROR] {type(e).__name__}: {e}")
-            print(f"[AGENT ERROR] Traceback: {traceback.format_exc()}")
-            ai_response_text = f"I apologize, but I'm having trouble processing your request. Error: {str(e)[:100]}"
+            await events.put(("error", e))
+        finally:
+            await events.put(None)
+
+    producer = asyncio.create_task(produce())
+
+    try:
+        # Create user message immediately
+        sent_at = datetime.utcnow()
+        user_message = Message(
+            conversation_id=message_data.conversation_id,
+            sender='user',
+            content=message_data.content,
+            created_at=sent_at
+        )
+        db.add(user_message)
+        # Bump now too, so cached conversation views pick up the user's message
+        # while the reply is still streaming
+        await _touch_conversation(db, message_data.conversation_id, sent_at)
+        # The flush fills in id (INSERT ... RETURNING) and expire_on_commit=False
+        # keeps it loaded, so no refresh SELECT is needed
+        await db.commit()
+    except BaseException:
+        producer.cancel()
+        raise
 
-        # Stream chunks with small delay for smoother animation
-        chunk_size = 80
-        for i in range(0, len(ai_response_text), chunk_size):
-            chunk = ai_response_text[i:i+chunk_size]
-            yield sse_pack('delta', { 'text': chunk })
-            time.sleep(0.05)  # 50ms delay for smooth typing effect
+    async def generator():
+        try:
+            # Notify start
+            yield sse_pack('start', {
+                'user_message_id': user_message.id,
+                'conversation_id': user_message.conversation_id
+            })
+
+            # Relay the reply as the agent generates it
+            ai_response_text = ""
+            while (event := await events.get()) is not None:
+                kind, payload = event
+                if kind == "delta":
+                    yield sse_delta(payload)
+                elif kind == "final":
+                    ai_response_text = payload.get("reply") or "I'm here to help, but I couldn't generate a response."
+                    logger.debug("Agent reply for thread %s: %d chars", thread_id, len(ai_response_text))
+                else:
+                    logger.error("Agent failed for thread %s", thread_id, exc_info=payload)
+                    ai_response_text = f"I apologize, but I'm having trouble processing your request. Error: {str(payload)[:100]}"
+                    yield sse_delta(ai_response_text)
+        finally:
+            # Client went away mid-stream: stop generating tokens nobody will read
+            if not producer.done():
+                producer.cancel()
 
         # Persist AI message once finished
+        replied_at = datetime.utcnow()
         ai_message = Message(
             conversation_id=message_data.conversation_id,
             sender='agent',
-            content=ai_response_text
+            content=ai_response_text,
+            created_at=replied_at
         )
         db.add(ai_message)
 
         # Update conversation timestamp
-        conversation.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(ai_message)
+        await _touch_conversation(db, message_data.conversation_id, replied_at)
+        await db.commit()
 
-        # Notify end with final ids
+        # Notify end with final ids and the persisted reply, shaped like
+        # send_message's response; clients should render it in place of the
+        # concatenated deltas, which may be partial or repeated after a retry
         yield sse_pack('end', {
             'ai_message_id': ai_message.id,
-            'conversation_id': ai_message.conversation_id
+            'conversation_id': ai_message.conversation_id,
+            'message': MessageResponse.model_validate(ai_message).model_dump(mode='json')
         })
 
-    return StreamingResponse(generator(), media_type="text/event-stream")
+    return StreamingResponse(generator(), media_type="text/event-stream", headers=SSE_HEADERS)
 
 # Update conversation title
 @router.put("/conversations/{conversation_id}/title", response_model=ConversationResponse)
-def update_conversation_title(
+async def update_conversation_title(
     conversation_id: int,
     payload: ConversationTitleUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    conversation = db.query(Conversation).filter(
-        Conversation.id == conversation_id,
-        Conversation.user_id == current_user.id
-    ).first()
+    # Ownership check, update and last-message preview in one statement:
+    # WITH updated AS (UPDATE ... WHERE id AND user_id RETURNING ...) SELECT ...
+    updated = (
+        update(Conversation)
+        .where(
+            Conversation.id == conversation_id,
+            Conversation.user_id == current_user.id
+        )
+        .values(title=payload.title, updated_at=datetime.utcnow())
+        .returning(
+            Conversation.id,
+            Conversation.user_id,
+            Conversation.title,
+            Conversation.conversation_type,
+            Conversation.created_at,
+            Conversation.updated_at
+        )
+        .cte("updated")
+    )
+    last_message = (
+        select(Message.content)
+        .where(Message.conversation_id == updated.c.id)
+        .order_by(Message.created_at.desc())
+        .limit(1)
+        .correlate(updated)
+        .scalar_subquery()
+    )
+    row = (await db.execute(
+        select(updated, last_message.label("last_message"))
+    )).mappings().first()
 
-    if not conversation:
+    if row is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
+    await db.commit()
 
-    conversation.title = payload.title
-    conversation.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(conversation)
-
-    # Compute last message preview
-    last_message = db.query(Message).filter(
-        Message.conversation_id == conversation.id
-    ).order_by(Message.created_at.desc()).first()
-
-    return ConversationResponse(
-        id=conversation.id,
-        user_id=conversation.user_id,
-        title=conversation.title,
-        conversation_type=conversation.conversation_type,
-        created_at=conversation.created_at,
-        updated_at=conversation.updated_at,
-        last_message=last_message.content if last_message else None,
-        unread_count=0
-    )
+    return ConversationResponse(**row, unread_count=0)
 
 # Delete a conversation
 @router.delete("/conversations/{conversation_id}")
-def delete_conversation(
+async def delete_conversation(
     conversation_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a conversation and all its messages"""
-    conversation = db.query(Conversation).filter(
-        Conversation.id == conversation_id,
-        Conversation.user_id == current_user.id
-    ).first()
+    # Ownership check and delete in one statement; messages go with it
+    # through ON DELETE CASCADE, however long the conversation is
+    deleted_id = await db.scalar(
+        delete(Conversation).where(
+            Conversation.id == conversation_id,
+            Conversation.user_id == current_user.id
+        ).returning(Conversation.id)
+    )
     
-    if not conversation:
+    if deleted_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
     
-    db.delete(conversation)
-    db.commit()
+    await db.commit()
     
     return {"message": "Conversation deleted successfully"}
-
-# Note: AI responses are now generated using the real LangGraph agent
-# The agent uses Gemini AI with user's farm data and context enrichment
-
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, raiseload
 from typing import List
 
 from config.database_config import get_db
@@ -7,15 +7,20 @@ from models.tables_models import FormResponse
 from utiles.schemas import FormCreate, FormUpdate, FormResponseSchema
 from routes.auth_routes import get_current_user
 from models.tables_models import User
+from agent.tools import invalidate_user_form
 
 router = APIRouter(prefix="/forms", tags=["forms"])
 
+# Every FormResponse query uses raiseload("*"): if the model gains
+# relationships, response serialization can't lazy-load one per row unnoticed
+
 
 @router.post("/", response_model=FormResponseSchema, status_code=status.HTTP_201_CREATED)
 def create_form_response(payload: FormCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     db_form = FormResponse(**payload.model_dump(), user_id=current_user.id)
     db.add(db_form)
     db.commit()
+    invalidate_user_form(current_user.id)
     db.refresh(db_form)
     return db_form
 
@@ -24,6 +29,7 @@ def create_form_response(payload: FormCreate, db: Session = Depends(get_db), cur
 def list_form_responses(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     return (
         db.query(FormResponse)
+        .options(raiseload("*"))
         .filter(FormResponse.user_id == current_user.id)
         .order_by(FormResponse.id.desc())
         .all()
@@ -34,6 +40,7 @@ def list_form_responses(db: Session = Depends(get_db), current_user: User = Depe
 def get_form_response(form_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     form = (
         db.query(FormResponse)
+        .options(raiseload("*"))
         .filter(FormResponse.id == form_id, FormResponse.user_id == current_user.id)
         .first()
     )
@@ -46,6 +53,7 @@ def get_form_response(form_id: int, db: Session = Depends(get_db), current_user:
 def update_form_response(form_id: int, payload: FormUpdate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     form = (
         db.query(FormResponse)
+        .options(raiseload("*"))
         .filter(FormResponse.id == form_id, FormResponse.user_id == current_user.id)
         .first()
     )
@@ -56,6 +64,7 @@ def update_form_response(form_id: int, payload: FormUpdate, db: Session = Depend
         setattr(form, key, value)
     db.add(form)
     db.commit()
+    invalidate_user_form(current_user.id)
     db.refresh(form)
     return form
 
@@ -64,6 +73,7 @@ def update_form_response(form_id: int, payload: FormUpdate, db: Session = Depend
 def delete_form_response(form_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     form = (
         db.query(FormResponse)
+        .options(raiseload("*"))
         .filter(FormResponse.id == form_id, FormResponse.user_id == current_user.id)
         .first()
     )
@@ -71,6 +81,7 @@ def delete_form_response(form_id: int, db: Session = Depends(get_db), current_us
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Form response not found")
     db.delete(form)
     db.commit()
+    invalidate_user_form(current_user.id)
     return None
 
 
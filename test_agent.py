@@ -3,6 +3,7 @@
 Quick test script to verify agent is working
 """
 
+import asyncio
 import sys
 from agent.main_agent import get_agent
 
@@ -30,7 +31,7 @@ def test_agent():
             "message": "What crops should I plant?"
         }
         
-        result = agent.invoke(state, {"configurable": {"thread_id": "test_123"}})
+        result = asyncio.run(agent.ainvoke(state, {"configurable": {"thread_id": "test_123"}}))
         
         if "reply" in result and result["reply"]:
             print("✅ Agent responded successfully!")
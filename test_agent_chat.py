@@ -7,9 +7,12 @@ import json
 
 BASE_URL = "http://127.0.0.1:8000"
 
+# Reuse one keep-alive connection for the login and every chat call
+session = requests.Session()
+
 # You need to login first to get a token
 def login():
-    response = requests.post(
+    response = session.post(
         f"{BASE_URL}/auth/login",
         data={
             "username": "your_email@example.com",  # Replace with your email
@@ -37,7 +40,7 @@ def test_agent_chat(token, message, thread_id="test_01"):
     print(f"USER: {message}")
     print(f"{'='*60}")
     
-    response = requests.post(
+    response = session.post(
         f"{BASE_URL}/agent/chat",
         headers=headers,
         json=data
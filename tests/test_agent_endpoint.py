@@ -4,6 +4,7 @@ Run with: pytest tests/test_agent_endpoint.py -v
 Or manually with: python -m tests.test_agent_endpoint
 """
 import requests
+from requests.adapters import HTTPAdapter
 import json
 from typing import Optional
 
@@ -13,6 +14,11 @@ BASE_URL = "http://127.0.0.1:8000"
 class AgentTester:
     def __init__(self, base_url: str = BASE_URL):
         self.base_url = base_url
+        # One keep-alive connection pool for every call in the test run
+        self.client = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10)
+        self.client.mount("http://", adapter)
+        self.client.mount("https://", adapter)
         self.token: Optional[str] = None
         self.thread_id: Optional[str] = None
     
@@ -21,7 +27,7 @@ class AgentTester:
         print(f"\n🔐 Setting up user: {email}")
         
         # Try login first
-        response = requests.post(
+        response = self.client.post(
             f"{self.base_url}/auth/login",
             json={"email": email, "password": password}
         )
@@ -35,7 +41,7 @@ class AgentTester:
                 "email": email,
                 "password": password
             }
-            response = requests.post(f"{self.base_url}/auth/register", json=register_data)
+            response = self.client.post(f"{self.base_url}/auth/register", json=register_data)
         
         if response.status_code not in [200, 201]:
             raise Exception(f"Auth failed: {response.status_code} - {response.text}")
@@ -51,7 +57,7 @@ class AgentTester:
         headers = {"Authorization": f"Bearer {self.token}"}
         
         # Check if form already exists
-        response = requests.get(f"{self.base_url}/forms/", headers=headers)
+        response = self.client.get(f"{self.base_url}/forms/", headers=headers)
         if response.status_code == 200 and len(response.json()) > 0:
             print("   ✅ Form already exists")
             return response.json()[0]
@@ -73,7 +79,7 @@ class AgentTester:
             "fertilizers_preference": "Organic preferred"
         }
         
-        response = requests.post(f"{self.base_url}/forms/", json=form_data, headers=headers)
+        response = self.client.post(f"{self.base_url}/forms/", json=form_data, headers=headers)
         
         if response.status_code != 201:
             raise Exception(f"Form creation failed: {response.status_code} - {response.text}")
@@ -89,7 +95,7 @@ class AgentTester:
         if thread_id:
             payload["thread_id"] = thread_id
         
-        response = requests.post(
+        response = self.client.post(
             f"{self.base_url}/agent/chat",
             json=payload,
             headers=headers
@@ -0,0 +1,98 @@
+"""
+Unit tests for Idempotency-Key deduplication on POST /messages
+Run with: pytest tests/test_idempotency.py -v
+"""
+import asyncio
+
+import pytest
+
+from routes import chat_routes
+from routes.chat_routes import _run_idempotent
+
+
+@pytest.fixture(autouse=True)
+def clear_replay_state():
+    chat_routes._idempotent_replies.clear()
+    chat_routes._inflight_replies.clear()
+    yield
+    chat_routes._idempotent_replies.clear()
+    chat_routes._inflight_replies.clear()
+
+
+class SlowTurn:
+    """Stands in for one agent turn; counts how often it actually runs"""
+
+    def __init__(self, result="reply", error=None):
+        self.calls = 0
+        self.result = result
+        self.error = error
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_concurrent_retries_run_the_turn_once():
+    turn = SlowTurn()
+
+    async def main():
+        return await asyncio.gather(*(_run_idempotent((1, "key"), turn) for _ in range(3)))
+
+    assert asyncio.run(main()) == ["reply", "reply", "reply"]
+    assert turn.calls == 1
+    assert not chat_routes._inflight_replies
+
+
+def test_later_retry_is_served_from_the_replay_cache():
+    turn = SlowTurn()
+
+    async def main():
+        first = await _run_idempotent((1, "key"), turn)
+        second = await _run_idempotent((1, "key"), turn)
+        return first, second
+
+    assert asyncio.run(main()) == ("reply", "reply")
+    assert turn.calls == 1
+
+
+def test_keys_are_scoped_per_user():
+    turn = SlowTurn()
+
+    async def main():
+        await asyncio.gather(_run_idempotent((1, "key"), turn), _run_idempotent((2, "key"), turn))
+
+    asyncio.run(main())
+    assert turn.calls == 2
+
+
+def test_without_a_key_every_request_runs():
+    turn = SlowTurn()
+
+    async def main():
+        await asyncio.gather(_run_idempotent(None, turn), _run_idempotent(None, turn))
+
+    asyncio.run(main())
+    assert turn.calls == 2
+
+
+def test_failure_reaches_waiters_and_is_not_remembered():
+    failing = SlowTurn(error=RuntimeError("db down"))
+
+    async def main():
+        return await asyncio.gather(
+            _run_idempotent((1, "key"), failing),
+            _run_idempotent((1, "key"), failing),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(main())
+    assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+    assert failing.calls == 1
+    assert not chat_routes._inflight_replies
+
+    retry = SlowTurn()
+    assert asyncio.run(_run_idempotent((1, "key"), retry)) == "reply"
+    assert retry.calls == 1
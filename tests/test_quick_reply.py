@@ -0,0 +1,45 @@
+"""
+Unit tests for the canned replies generate_reply sends without calling the LLM
+Run with: pytest tests/test_quick_reply.py -v
+"""
+import pytest
+
+from agent.main_agent import (
+    CONFIRMATION_REPLY,
+    FAREWELL_REPLY,
+    GREETING_REPLY,
+    THANKS_REPLY,
+    _quick_reply,
+)
+
+
+@pytest.mark.parametrize("message", ["hi", "Hello!", "  salam  ", "Assalam o Alaikum."])
+def test_greetings(message):
+    assert _quick_reply(message) == GREETING_REPLY
+
+
+@pytest.mark.parametrize("message", ["thanks", "Thank you!", "shukriya"])
+def test_thanks(message):
+    assert _quick_reply(message) == THANKS_REPLY
+
+
+@pytest.mark.parametrize("message", ["bye", "Bye!", "Goodbye.", "bye bye", "Khuda Hafiz", "allah hafiz!"])
+def test_farewells(message):
+    assert _quick_reply(message) == FAREWELL_REPLY
+
+
+@pytest.mark.parametrize("message", ["ok", "OK", "okay.", " Okay! "])
+def test_confirmations(message):
+    assert _quick_reply(message) == CONFIRMATION_REPLY
+
+
+@pytest.mark.parametrize("message", [
+    "ok, what should I plant next?",
+    "bye, one more question about wheat first",
+    "what is my name?",
+    "hi, my name is Ali",
+    "I am tired",
+    "",
+])
+def test_other_messages_go_to_the_llm(message):
+    assert _quick_reply(message) is None
@@ -1,31 +1,59 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 import hashlib
+import hmac
+import time
 from fastapi import HTTPException, status
+from utiles.cache_utiles import TTLCache
 
 # Simple JWT Configuration
 SECRET_KEY = "your-secret-key-change-this-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Built once instead of per decode; our tokens carry no aud/iss claims
+_ALGORITHMS = [ALGORITHM]
+_DECODE_OPTIONS = {"verify_aud": False, "verify_iss": False}
+
+# Salt as bytes once, used as the BLAKE2b key (no per-call concat/encode)
+_SALT = b"regenai_salt_2024"
+# Marks BLAKE2b hashes; older rows hold an unprefixed SHA-256 hex digest
+_BLAKE2_PREFIX = "b2$"
+
+def _legacy_password_hash(password: str) -> str:
+    return hashlib.sha256(password.encode() + _SALT).hexdigest()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return get_password_hash(plain_password) == hashed_password
+    if hashed_password.startswith(_BLAKE2_PREFIX):
+        candidate = get_password_hash(plain_password)
+    else:
+        candidate = _legacy_password_hash(plain_password)
+    return hmac.compare_digest(candidate, hashed_password)
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    return not hashed_password.startswith(_BLAKE2_PREFIX)
 
 def get_password_hash(password: str) -> str:
-    # Simple SHA-256 hash with salt (for demo purposes)
+    # Keyed BLAKE2b with a fixed salt (for demo purposes)
     # In production, use a proper password hashing library
-    salt = "regenai_salt_2024"
-    return hashlib.sha256((password + salt).encode()).hexdigest()
+    return _BLAKE2_PREFIX + hashlib.blake2b(password.encode(), key=_SALT, digest_size=32).hexdigest()
 
 def create_access_token(data: dict):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+# Decoded payloads of recently seen tokens, so a client's burst of requests
+# pays for signature verification and claim parsing once
+_token_cache = TTLCache(maxsize=10_000, ttl=60)
+
 def verify_token(token: str) -> dict:
+    payload = _token_cache.get(token)
+    if payload is not None and payload.get("exp", 0) > time.time():
+        return payload
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=_ALGORITHMS, options=_DECODE_OPTIONS)
+        _token_cache.set(token, payload)
         return payload
     except JWTError:
         raise HTTPException(
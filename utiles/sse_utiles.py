@@ -0,0 +1,37 @@
+import json
+
+try:  # orjson ships with fastapi[all]; fall back to the stdlib if it's missing
+    import orjson
+except ImportError:
+    orjson = None
+
+# Proxies (nginx in particular) buffer responses by default, which holds back
+# streamed tokens until the buffer fills; these tell them not to
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def _dumps(obj: dict) -> str:
+    # Non-ASCII text (Urdu/Hindi crop names, etc.) goes out as UTF-8, not \uXXXX escapes
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def sse_pack(event: str, data: dict) -> str:
+    """Format one server-sent event in the {'event', 'data'} envelope the frontend expects"""
+    return f"data: {_dumps({'event': event, 'data': data})}\n\n"
+
+
+# Delta frames are most of a stream, so their constant envelope is prebuilt
+# and only the text is encoded per token; the output matches sse_pack('delta', ...)
+_DELTA_PREFIX = b'data: {"event":"delta","data":{"text":'
+_DELTA_SUFFIX = b'}}\n\n'
+
+
+def sse_delta(text: str) -> bytes:
+    """Encoded 'delta' event for one chunk of reply text"""
+    if orjson is not None:
+        encoded = orjson.dumps(text)
+    else:
+        encoded = json.dumps(text, ensure_ascii=False).encode()
+    return _DELTA_PREFIX + encoded + _DELTA_SUFFIX